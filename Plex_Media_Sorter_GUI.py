@@ -0,0 +1,634 @@
+"""
+PyQt5 user interface for the Plex Media Sorter.
+
+This module is only imported when the application is started in GUI mode, so the
+headless command line (see Plex_Media_Sorter_TMDB.py) never pays for loading Qt.
+The sorter's main() passes in its SorterWorker class rather than this module importing
+Plex_Media_Sorter_TMDB, which would load a second copy of it when it runs as a script.
+"""
+import os
+import logging
+
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
+                             QPushButton, QLabel, QLineEdit, QFileDialog, QMessageBox,
+                             QRadioButton, QCheckBox, QProgressBar, QTextEdit, QFrame,
+                             QScrollArea, QButtonGroup)
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QObject
+from PyQt5.QtGui import QFont, QPalette, QColor, QPixmap, QTextCursor
+
+# How long Force Stop lets the pipeline stages drain before terminating the worker thread
+FORCE_STOP_WAIT_MS = 10000
+
+
+# =============================================================================
+# PyQt5 GUI Components
+# =============================================================================
+
+class UILogger(QObject, logging.Handler):
+    """
+    A custom logging handler that sends log records to the UI thread via a signal.
+    This avoids direct UI manipulation from other threads, preventing crashes.
+    """
+    log_updated = pyqtSignal(str)
+
+    def __init__(self, *args, **kwargs):
+        # Correctly initialize both parent classes
+        QObject.__init__(self, *args, **kwargs)
+        logging.Handler.__init__(self)
+
+    def emit(self, record):
+        msg = self.format(record)
+        self.log_updated.emit(msg)
+
+
+class WorkerBridge(QObject):
+    """
+    Re-emits SorterWorker's plain callbacks as Qt signals. The bridge lives in the worker
+    thread, so these signals are queued to the UI thread and widgets are never touched
+    from the worker.
+    """
+    log_message = pyqtSignal(str)
+    total_progress_update = pyqtSignal(int, int) # max, value
+    file_progress_update = pyqtSignal(int, int) # max, value
+    fetching_progress_update = pyqtSignal(int, int) # max, value
+    selection_needed = pyqtSignal(list)
+    finished = pyqtSignal(bool) # True if stopped by user, False otherwise
+
+    def __init__(self, worker):
+        super().__init__()
+        self.worker = worker
+        worker.log_message.connect(self.log_message.emit)
+        worker.total_progress_update.connect(self.total_progress_update.emit)
+        worker.file_progress_update.connect(self.file_progress_update.emit)
+        worker.fetching_progress_update.connect(self.fetching_progress_update.emit)
+        worker.selection_needed.connect(self.selection_needed.emit)
+        worker.finished.connect(self.finished.emit)
+
+    def run(self):
+        """Slot connected to QThread.started, so the sort runs in the worker thread."""
+        self.worker.run()
+
+
+class MainWindow(QMainWindow):
+    """The main application window. Sorting runs in `worker_class` (SorterWorker) objects."""
+    def __init__(self, worker_class):
+        super().__init__()
+        self.worker_class = worker_class
+        self.worker = None
+        self.bridge = None
+        self.thread = None
+        self.stopped_worker = None # A force-stopped worker whose transfers may still be finishing
+        self.selection_results = []
+        self.selection_widgets = []
+        self.selection_groups = []
+        self.init_ui()
+
+    def init_ui(self):
+        self.setWindowTitle("Plex Media Sorter (PyQt5 Edition)")
+        self.setGeometry(100, 100, 1400, 800)
+        
+        # Apply a dark theme stylesheet
+        self.setStyleSheet("""
+            QMainWindow {
+                background-color: #1f1f1f;
+            }
+            QFrame {
+                background-color: #1f1f1f;
+            }
+            QWidget {
+                color: #e0e0e0;
+                font-family: Helvetica;
+            }
+            QLabel {
+                color: #e5a00d; /* Plex Gold */
+                font-size: 12px;
+                background-color: transparent;
+            }
+            #TitleLabel {
+                font-weight: bold;
+                font-size: 14px;
+            }
+            #WarningLabel {
+                color: #999;
+                font-size: 9px;
+            }
+            QLineEdit {
+                background-color: #333;
+                border: 1px solid #555;
+                border-radius: 4px;
+                padding: 4px;
+                font-size: 12px;
+            }
+            QPushButton {
+                background-color: #e5a00d;
+                color: black;
+                font-size: 12px;
+                font-weight: bold;
+                border: none;
+                padding: 8px 16px;
+                border-radius: 4px;
+            }
+            QPushButton:hover {
+                background-color: #f0b429;
+            }
+            QPushButton:disabled {
+                background-color: #555;
+                color: #999;
+            }
+            #StopButton, #SkipButton {
+                background-color: #4c4c4c;
+                color: white;
+            }
+            #StopButton:hover, #SkipButton:hover {
+                background-color: #666;
+            }
+            #ForceStopButton {
+                background-color: #c00;
+                color: white;
+            }
+            #ForceStopButton:hover {
+                background-color: #e00;
+            }
+            QTextEdit, QScrollArea {
+                background-color: black;
+                color: #e5a00d;
+                border: 1px solid #4c4c4c;
+                border-radius: 4px;
+            }
+            QTextEdit {
+                 font-family: "Courier New", monospace;
+            }
+            QScrollArea > QWidget > QWidget {
+                background-color: black;
+            }
+            QProgressBar {
+                border: 1px solid #4c4c4c;
+                border-radius: 4px;
+                text-align: center;
+                color: white;
+            }
+            QProgressBar::chunk {
+                background-color: #e5a00d;
+                border-radius: 4px;
+            }
+            QRadioButton, QCheckBox {
+                font-size: 11px;
+                background-color: transparent;
+            }
+            QRadioButton::indicator::unchecked, QCheckBox::indicator::unchecked {
+                border: 1px solid #999;
+                background-color: #333;
+                border-radius: 7px;
+                width: 12px;
+                height: 12px;
+            }
+            QRadioButton::indicator::checked, QCheckBox::indicator::checked {
+                border: 1px solid #e5a00d;
+                background-color: #e5a00d;
+                border-radius: 7px;
+                width: 12px;
+                height: 12px;
+            }
+        """)
+
+        # Main container widget and layout
+        main_container = QWidget()
+        self.setCentralWidget(main_container)
+        outer_layout = QVBoxLayout(main_container)
+        main_layout = QHBoxLayout()
+
+        # --- Left Info Pane ---
+        left_pane = QFrame()
+        left_pane.setFixedWidth(250)
+        left_layout = QVBoxLayout(left_pane)
+        
+        info_text = """
+<b>Plex Media Sorter</b>
+<p>Designed by<br>TheIrishPacifist</p>
+<p>Programmed and<br>
+designed to assist<br>
+users in sorting their<br>
+media library for Plex.<br>
+This application could<br>
+be used for other<br>
+services, but please<br>
+check naming<br>
+requirements.</p>
+<p>For Plex we use:</p>
+<p>Movie Name (Year)<br>
+&<br>
+S00E00 - Episode<br>
+Name (zeros will<br>
+match the max number<br>
+of episodes, ex: a<br>
+season with 100<br>
+episodes would be<br>
+S01E001)</p>
+        """
+        info_label = QLabel(info_text)
+        info_label.setWordWrap(True)
+        info_label.setAlignment(Qt.AlignTop)
+        
+        # Plex Logo - Add your path here
+        plex_logo_label = QLabel()
+        try:
+            # Using a placeholder path, replace with your actual path
+            plex_pixmap = QPixmap("/home/jamescreamer/Pictures/plex_logo.png").scaled(150, 150, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            plex_logo_label.setPixmap(plex_pixmap)
+        except Exception:
+            plex_logo_label.setText("Plex Logo Not Found")
+
+        left_layout.addWidget(info_label)
+        left_layout.addStretch()
+        left_layout.addWidget(plex_logo_label, alignment=Qt.AlignCenter)
+        left_layout.addWidget(QLabel("<i>Not sponsored or endorsed by Plex.</i>"), alignment=Qt.AlignCenter)
+
+        # --- Center Controls Pane ---
+        center_pane = QFrame()
+        center_layout = QVBoxLayout(center_pane)
+
+        # Directory Selection
+        center_layout.addWidget(QLabel("<b>Unsorted Media Location:</b>"))
+        self.source_dir_edit = QLineEdit()
+        center_layout.addWidget(self.source_dir_edit)
+        center_layout.addWidget(self._create_browse_button(self.source_dir_edit))
+
+        center_layout.addWidget(QLabel("<b>Sorted Media Destination:</b>"))
+        self.dest_dir_edit = QLineEdit()
+        center_layout.addWidget(self.dest_dir_edit)
+        center_layout.addWidget(self._create_browse_button(self.dest_dir_edit))
+
+        # Media Type Options
+        center_layout.addWidget(QLabel("<b>Select Your Media Type:</b>"))
+        self.radio_both = QRadioButton("Movies and TV Shows")
+        self.radio_tv = QRadioButton("TV Shows Only")
+        self.radio_movies = QRadioButton("Movies Only")
+        self.radio_both.setChecked(True)
+        center_layout.addWidget(self.radio_both)
+        center_layout.addWidget(self.radio_tv)
+        center_layout.addWidget(self.radio_movies)
+        
+        # Other Options
+        self.keep_originals_check = QCheckBox("Keep Original Files?")
+        self.generate_log_check = QCheckBox("Generate Debug Log?")
+        self.generate_log_check.setChecked(True) # Default to on
+        self.generate_log_check.setEnabled(False) # Keep it always on for now
+        
+        options_layout = QHBoxLayout()
+        options_layout.addWidget(self.keep_originals_check)
+        options_layout.addWidget(self.generate_log_check)
+        center_layout.addLayout(options_layout)
+
+        # Hardlinks only make sense when the originals are kept
+        self.hardlink_check = QCheckBox("Hardlink Instead of Copying (same drive)?")
+        self.hardlink_check.setEnabled(False)
+        self.keep_originals_check.toggled.connect(self.hardlink_check.setEnabled)
+        center_layout.addWidget(self.hardlink_check)
+
+        self.auto_select_check = QCheckBox("Auto-select Confident Matches?")
+        self.auto_select_check.setChecked(True)
+        center_layout.addWidget(self.auto_select_check)
+
+        self.only_new_check = QCheckBox("Only Process New or Changed Files?")
+        self.only_new_check.setChecked(True)
+        center_layout.addWidget(self.only_new_check)
+
+        self.watch_check = QCheckBox("Keep Watching for New Files?")
+        center_layout.addWidget(self.watch_check)
+
+
+        # Action Buttons
+        self.start_button = QPushButton("Start Sorting")
+        self.start_button.clicked.connect(self.start_sorting)
+        center_layout.addWidget(self.start_button)
+        
+        self.stop_button = QPushButton("Stop Sorting")
+        self.stop_button.setObjectName("StopButton")
+        self.stop_button.setEnabled(False)
+        self.stop_button.clicked.connect(self.stop_sorting)
+        center_layout.addWidget(self.stop_button)
+
+        self.force_stop_button = QPushButton("Force Stop Process and Generate Debug Log")
+        self.force_stop_button.setObjectName("ForceStopButton")
+        self.force_stop_button.clicked.connect(self.force_stop)
+        center_layout.addWidget(self.force_stop_button)
+        
+        # FIX: Add warning label for force stop button
+        warning_label = QLabel("Only click this if the program is frozen. File transfers already in progress "
+                               "still finish. Please send me the debug log.")
+        warning_label.setObjectName("WarningLabel")
+        warning_label.setWordWrap(True)
+        center_layout.addWidget(warning_label)
+
+
+        # Progress Bars
+        center_layout.addStretch()
+        center_layout.addWidget(QLabel("Fetching Progress:"))
+        self.fetching_progress = QProgressBar()
+        center_layout.addWidget(self.fetching_progress)
+        
+        center_layout.addWidget(QLabel("Copy Progress:"))
+        self.file_progress = QProgressBar()
+        center_layout.addWidget(self.file_progress)
+
+        center_layout.addWidget(QLabel("Overall Progress:"))
+        self.total_progress = QProgressBar()
+        center_layout.addWidget(self.total_progress)
+        center_layout.addStretch()
+
+        # Your Logo - Add your path here
+        your_logo_label = QLabel()
+        try:
+            # Using a placeholder path, replace with your actual path
+            your_pixmap = QPixmap("/home/jamescreamer/Pictures/171210048.png").scaled(200, 200, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            your_logo_label.setPixmap(your_pixmap)
+        except Exception:
+            your_logo_label.setText("Your Logo Not Found")
+        center_layout.addWidget(your_logo_label, alignment=Qt.AlignCenter)
+
+
+        # --- Right Log Pane ---
+        right_pane = QFrame()
+        right_layout = QVBoxLayout(right_pane)
+
+        right_layout.addWidget(QLabel("<b>Action Log:</b>", objectName="TitleLabel"))
+        self.log_area = QTextEdit()
+        self.log_area.setReadOnly(True)
+        right_layout.addWidget(self.log_area, 2) # Give log area more space
+        
+        right_layout.addWidget(QLabel("<b>Review Queue (if needed):</b>", objectName="TitleLabel"))
+        self.selection_scroll_area = QScrollArea()
+        self.selection_scroll_area.setWidgetResizable(True)
+        self.selection_container = QWidget()
+        self.selection_layout = QVBoxLayout(self.selection_container)
+        self.selection_layout.setAlignment(Qt.AlignTop)
+        self.selection_scroll_area.setWidget(self.selection_container)
+        right_layout.addWidget(self.selection_scroll_area, 1) # Give selection less space
+
+        selection_button_layout = QHBoxLayout()
+        self.select_button = QPushButton("Select")
+        self.select_button.setEnabled(False)
+        self.select_button.clicked.connect(self.on_select_clicked)
+        self.skip_button = QPushButton("Skip")
+        self.skip_button.setObjectName("SkipButton")
+        self.skip_button.setEnabled(False)
+        self.skip_button.clicked.connect(self.on_skip_clicked)
+        selection_button_layout.addWidget(self.select_button)
+        selection_button_layout.addWidget(self.skip_button)
+        right_layout.addLayout(selection_button_layout)
+
+        # Setup thread-safe logging
+        log_handler = UILogger()
+        log_handler.setFormatter(logging.Formatter('%(message)s'))
+        log_handler.log_updated.connect(self.append_log_message) # Connect signal to slot
+        logging.getLogger().addHandler(log_handler)
+        logging.getLogger().setLevel(logging.INFO) # UI only needs to see INFO level and above
+        
+        # Add panes to main layout
+        main_layout.addWidget(left_pane)
+        main_layout.addWidget(center_pane)
+        main_layout.addWidget(right_pane, 3) # Give right pane more weight
+
+        help_label = QLabel("Please reach out with any bugs or check for updates at https://github.com/IrshPcfst")
+        help_label.setAlignment(Qt.AlignCenter)
+
+        outer_layout.addLayout(main_layout)
+        outer_layout.addWidget(help_label)
+
+    def append_log_message(self, message):
+        """Thread-safe method to append text to the log area."""
+        self.log_area.append(message)
+        self.log_area.moveCursor(QTextCursor.End)
+
+    def _create_browse_button(self, target_line_edit):
+        """Helper to create a browse button."""
+        button = QPushButton("Browse")
+        button.clicked.connect(lambda: self.browse_directory(target_line_edit))
+        return button
+
+    def browse_directory(self, target_line_edit):
+        """Opens a dialog to select a directory."""
+        directory = QFileDialog.getExistingDirectory(self, "Select Directory")
+        if directory:
+            target_line_edit.setText(directory)
+
+    def start_sorting(self):
+        """Validates inputs and starts the sorting worker thread."""
+        source = self.source_dir_edit.text()
+        dest = self.dest_dir_edit.text()
+
+        if not source or not dest or not os.path.isdir(source) or not os.path.isdir(dest):
+            QMessageBox.critical(self, "Error", "Please select valid source and destination folders.")
+            return
+        if self.stopped_worker and self.stopped_worker.transfers_in_progress():
+            # They still write to the journal a new run would recover and delete
+            QMessageBox.warning(self, "Busy", "File transfers from the force-stopped run are still finishing. "
+                                              "Please try again in a moment.")
+            return
+        self.stopped_worker = None
+
+        # Determine sort mode
+        if self.radio_tv.isChecked():
+            sort_mode = "tv"
+        elif self.radio_movies.isChecked():
+            sort_mode = "movies"
+        else:
+            sort_mode = "both"
+            
+        keep_originals = self.keep_originals_check.isChecked()
+        # The worker's default threshold auto-selects; None always prompts
+        options = {} if self.auto_select_check.isChecked() else {'auto_select_threshold': None}
+
+        # --- Setup and start the worker thread ---
+        self.thread = QThread()
+        self.worker = self.worker_class(source, dest, sort_mode, keep_originals,
+                                        use_scan_index=self.only_new_check.isChecked(),
+                                        watch=self.watch_check.isChecked(),
+                                        hardlink_originals=self.hardlink_check.isChecked(),
+                                        **options)
+        self.bridge = WorkerBridge(self.worker)
+        self.bridge.moveToThread(self.thread)
+
+        # Connect worker signals to UI slots
+        self.bridge.log_message.connect(self.append_log_message)
+        self.bridge.total_progress_update.connect(lambda m, v: self.update_progress(self.total_progress, m, v))
+        self.bridge.file_progress_update.connect(lambda m, v: self.update_progress(self.file_progress, m, v))
+        self.bridge.fetching_progress_update.connect(lambda m, v: self.update_progress(self.fetching_progress, m, v))
+        self.bridge.selection_needed.connect(self.handle_selection_request)
+        self.bridge.finished.connect(self.on_sorting_finished)
+        
+        self.thread.started.connect(self.bridge.run)
+        
+        self.thread.start()
+
+        # Update UI state
+        self.set_ui_state(is_sorting=True)
+        self.log_area.clear()
+        logging.info(f"Starting sort. Source: '{source}', Dest: '{dest}', Mode: '{sort_mode}', Keep Originals: {keep_originals}")
+
+    def stop_sorting(self):
+        """Signals the worker thread to stop."""
+        if self.worker:
+            self.worker.stop()
+            self.stop_button.setText("Stopping...")
+            self.stop_button.setEnabled(False)
+            self.force_stop_button.setEnabled(False)
+
+    def force_stop(self):
+        """
+        Stops the worker and gives the pipeline stages a bounded time to drain, then
+        terminates the worker thread to restore UI responsiveness. The file transfers run
+        on their own pipeline threads, which terminate() cannot reach, so transfers already
+        in flight are not killed: they finish in the background.
+        """
+        if self.thread and self.thread.isRunning():
+            logging.warning("--- FORCE STOP ACTIVATED ---")
+            self.append_log_message("--- FORCE STOP ACTIVATED ---")
+            self.bridge.finished.disconnect(self.on_sorting_finished) # The UI is reset below instead
+            self.worker.stop() # Queued files are skipped from here on
+            if not self.thread.wait(FORCE_STOP_WAIT_MS):
+                self.thread.terminate() # Kill a frozen worker thread
+                self.thread.wait() # Wait for termination to complete
+            if self.worker.transfers_in_progress():
+                self.stopped_worker = self.worker
+                self.append_log_message(f"{self.worker.transfers_in_progress()} file transfer(s) already in "
+                                        f"progress will finish in the background.")
+            self.on_sorting_finished(stopped_by_user=True) # Reset the UI
+
+
+    def handle_selection_request(self, items):
+        """
+        Populates the inline selection pane with every pending review item at once.
+        Each item gets its own group of options: its candidates, "Skip" and "Decide Later".
+        """
+        self.clear_selection_pane()
+        self.selection_results = items
+        
+        for item in self.selection_results:
+            file_count = len(item['files'])
+            header = QLabel(f"<b>{item['label']}</b> ({file_count} file{'s' if file_count != 1 else ''})")
+            self.selection_layout.addWidget(header)
+            self.selection_widgets.append(header)
+
+            group = QButtonGroup(self)
+            for i, candidate in enumerate(item['candidates']):
+                is_tv = hasattr(candidate, 'id') and hasattr(candidate, 'name') and hasattr(candidate, 'first_air_date')
+                is_movie = hasattr(candidate, 'id') and hasattr(candidate, 'title') and hasattr(candidate, 'release_date')
+
+                if is_tv:
+                    title = candidate.name
+                    year = candidate.first_air_date.split('-')[0] if candidate.first_air_date else "N/A"
+                    kind = "TV Series"
+                elif is_movie:
+                    title = candidate.title
+                    year = candidate.release_date.split('-')[0] if candidate.release_date else "N/A"
+                    kind = "Movie"
+                else:
+                    logging.warning(f"Skipping malformed item in selection dialog: {candidate}")
+                    continue
+
+                rb = QRadioButton(f"{title} ({year}) - [{kind}]")
+                group.addButton(rb, i)
+                self.selection_layout.addWidget(rb)
+                self.selection_widgets.append(rb)
+
+            for text, button_id in (("Skip", len(item['candidates'])), ("Decide Later", len(item['candidates']) + 1)):
+                rb = QRadioButton(text)
+                group.addButton(rb, button_id)
+                self.selection_layout.addWidget(rb)
+                self.selection_widgets.append(rb)
+
+            group.buttons()[0].setChecked(True)
+            self.selection_groups.append(group)
+        
+        if self.selection_groups:
+            self.select_button.setEnabled(True)
+            self.skip_button.setEnabled(True)
+
+    def on_select_clicked(self):
+        """Handles the 'Select' button click by sending one decision per review item."""
+        choices = []
+        for item, group in zip(self.selection_results, self.selection_groups):
+            button_id = group.checkedId()
+            if button_id < len(item['candidates']):
+                choices.append(item['candidates'][button_id])
+            elif button_id == len(item['candidates']):
+                choices.append("skip")
+            else:
+                choices.append(None) # Decide later
+        if self.worker:
+            self.worker.set_user_choice(choices)
+        self.clear_selection_pane()
+
+    def on_skip_clicked(self):
+        """Handles the 'Skip' button click (skips every pending item)."""
+        if self.worker:
+            self.worker.set_user_choice("skip")
+        self.clear_selection_pane()
+    
+    def clear_selection_pane(self):
+        """Clears the review items from the selection area."""
+        for widget in self.selection_widgets:
+            self.selection_layout.removeWidget(widget)
+            widget.deleteLater()
+        self.selection_widgets.clear()
+        self.selection_groups.clear()
+        self.selection_results = []
+        self.select_button.setEnabled(False)
+        self.skip_button.setEnabled(False)
+
+    def on_sorting_finished(self, stopped_by_user):
+        """Cleans up after the worker thread is done."""
+        if stopped_by_user:
+            logging.info("Sorting stopped by user.")
+            self.append_log_message("\n--- Sorting Stopped by User ---")
+        else:
+            logging.info("Sorting completed successfully.")
+            self.append_log_message("\n--- Sorting Complete! ---")
+            QMessageBox.information(self, "Complete", "All files have been processed!")
+        
+        self.set_ui_state(is_sorting=False)
+        if self.thread and self.thread.isRunning():
+            self.thread.quit()
+            self.thread.wait()
+        self.thread = None
+        self.worker = None
+        self.bridge = None
+
+
+    def update_progress(self, progress_bar, max_val, value):
+        """Updates a progress bar's value."""
+        if progress_bar.maximum() != max_val:
+            progress_bar.setMaximum(max_val)
+        progress_bar.setValue(value)
+
+    def set_ui_state(self, is_sorting):
+        """Enables or disables UI elements based on sorting state."""
+        self.start_button.setEnabled(not is_sorting)
+        self.stop_button.setEnabled(is_sorting)
+        self.force_stop_button.setEnabled(is_sorting)
+        self.stop_button.setText("Stop Sorting")
+        self.source_dir_edit.setEnabled(not is_sorting)
+        self.dest_dir_edit.setEnabled(not is_sorting)
+        
+        if not is_sorting:
+            self.update_progress(self.total_progress, 1, 0)
+            self.update_progress(self.file_progress, 1, 0)
+            self.update_progress(self.fetching_progress, 1, 0)
+            self.clear_selection_pane()
+
+    def closeEvent(self, event):
+        """Ensure the worker thread is stopped when closing the window."""
+        if self.thread and self.thread.isRunning():
+            self.stop_sorting()
+            self.thread.quit()
+            self.thread.wait()
+        event.accept()
+
+
+def run_gui(argv, worker_class):
+    """Starts the Qt application and blocks until the main window is closed."""
+    app = QApplication(argv)
+    main_win = MainWindow(worker_class)
+    main_win.show()
+    return app.exec_()
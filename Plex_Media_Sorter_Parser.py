@@ -0,0 +1,244 @@
+"""
+Filename parser for the Plex Media Sorter.
+
+Extracts the title, year, season/episode (or absolute episode number or air date) and release tags of a media file or folder
+name in a single pass with precompiled patterns. The result is a small ParsedName
+record that every stage of the sorter reuses instead of re-running its own regexes.
+
+Run this module with --benchmark to time the parser:
+    python Plex_Media_Sorter_Parser.py --benchmark [count]
+"""
+import re
+import sys
+import time
+import random
+import argparse
+from functools import lru_cache
+
+
+# =============================================================================
+# Patterns
+# =============================================================================
+
+# Names are split into tokens at dots, underscores and spaces, and each token is
+# classified with dict lookups and string tests; only episode tokens need a regex.
+# Multi-episode files ("S01E01E02", "S01E01-E03") capture their last episode too.
+EPISODE_PATTERN = re.compile(r'(?<![a-z])s(\d{1,2})e(\d{1,3})(?:-?e(\d{1,3}))*(?!\d)')
+
+# [...] and (...) groups are dropped whole, except a group holding just a year ("(1999)"),
+# which is replaced by the year (captured, so no second regex runs per group)
+GROUP_PATTERN = re.compile(r'[\[(]\s*((?:19|20)\d{2})\s*[\])]|\[[^\]]*\]|\([^)]*\)')
+
+# Release tags (lowercase) and the ParsedName field each one fills
+RELEASE_TAGS = {
+    '2160p': 'resolution', '1080p': 'resolution', '720p': 'resolution', '480p': 'resolution',
+    'bluray': 'source', 'blu-ray': 'source', 'web-dl': 'source', 'webrip': 'source',
+    'hdtv': 'source', 'dvdrip': 'source', 'remux': 'source',
+    'x264': 'codec', 'x265': 'codec', 'h264': 'codec', 'h265': 'codec', 'hevc': 'codec',
+}
+
+
+class ParsedName:
+    """What the parser found in one name. Fields it did not find are None."""
+    __slots__ = ('title', 'year', 'season', 'episode', 'last_episode', 'absolute_episode', 'air_date',
+                 'resolution', 'source', 'codec', 'extension')
+
+    def __init__(self, title, year=None, season=None, episode=None, last_episode=None, absolute_episode=None,
+                 air_date=None, resolution=None, source=None, codec=None, extension=""):
+        self.title = title # Cleaned search title, e.g. "The Matrix"
+        self.year = year
+        self.season = season
+        self.episode = episode
+        self.last_episode = last_episode # Set for multi-episode files only, e.g. 3 for "S01E01-E03"
+        self.absolute_episode = absolute_episode # e.g. 137 for "[Group] Show - 137", as most anime is numbered
+        self.air_date = air_date # "YYYY-MM-DD" for daily shows, e.g. "Show.2024.03.14"
+        self.resolution = resolution # e.g. "1080p"
+        self.source = source # e.g. "bluray"
+        self.codec = codec # e.g. "x264"
+        self.extension = extension # Including the dot; empty for folder names
+
+    @property
+    def is_episode(self):
+        """True for any TV episode: SxxExx, absolute or air-date numbering."""
+        return self.season is not None or self.absolute_episode is not None or self.air_date is not None
+
+    @property
+    def episodes(self):
+        """Every episode number the file covers, e.g. [1, 2, 3] for "S01E01-E03"."""
+        if self.season is None:
+            return []
+        return list(range(self.episode, (self.last_episode or self.episode) + 1))
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__
+                           if getattr(self, name) not in (None, ""))
+        return f"ParsedName({fields})"
+
+
+# =============================================================================
+# Parser
+# =============================================================================
+
+@lru_cache(maxsize=4096)
+def parse_name(name, is_file=True):
+    """
+    Parses a file name (or a folder name with is_file=False, which is never split at
+    a dot into name and extension). Results are cached, as every episode of a show
+    parses the same folder name.
+    """
+    return _parse(name, is_file)
+
+
+def _replace_group(match):
+    """Drops a [...] or (...) group, keeping a year group's year in place."""
+    year = match.group(1)
+    return " " + year + " " if year else " "
+
+
+def _air_date(year, month_day):
+    """Returns "YYYY-MM-DD" when ["MM", "DD"] complete a plausible date after the year, else None."""
+    if len(month_day) != 2 or not all(len(part) == 2 and part.isdigit() for part in month_day):
+        return None
+    month, day = month_day
+    if 1 <= int(month) <= 12 and 1 <= int(day) <= 31:
+        return f"{year}-{month}-{day}"
+    return None
+
+
+def _is_absolute_episode(token, bracketed):
+    """
+    Whether the number in "Title - N" is an absolute episode number rather than part of a
+    movie title ("Apollo - 13", "Movie - 2"): it must be zero-padded or 3-4 digits long
+    ("Show - 01", "Show - 137"), unless a [Group] tag marks the name as an anime release.
+    """
+    if len(token) > 4:
+        return False
+    return bracketed or len(token) >= 3 or token[0] == '0'
+
+
+def _parse(name, is_file=True):
+    extension = ""
+    if is_file:
+        base, _, suffix = name.rpartition('.')
+        if base and 0 < len(suffix) <= 4 and suffix.isalnum(): # Cheaper than os.path.splitext
+            name, extension = base, '.' + suffix
+    bracketed = '[' in name # "[Group] Show - 12 [1080p]": release-group context, as on anime releases
+    if bracketed or '(' in name:
+        name = GROUP_PATTERN.sub(_replace_group, name)
+
+    words = []
+    years = []
+    found = {}
+    tokens = name.replace('.', ' ').replace('_', ' ').split()
+    skip = 0 # Tokens already consumed by an air date
+    dashed = False # The previous token was a lone " - " separator
+    title_end = None # Number of title words before the first episode number or air date
+    for i, token in enumerate(tokens):
+        if skip:
+            skip -= 1
+            continue
+        lower = token.lower()
+        tag = lower
+        kind = RELEASE_TAGS.get(tag)
+        if kind is None and lower.isalpha(): # A plain title word, by far the most common token
+            words.append(token)
+            dashed = False
+            continue
+        if kind is None and '-' in lower:
+            # "x264-GROUP": a release tag with the release group attached
+            tag = lower.split('-', 1)[0]
+            kind = RELEASE_TAGS.get(tag)
+            if kind is None and not lower.strip('-'):
+                dashed = True
+                continue # A lone " - " separator
+        after_dash, dashed = dashed, False
+        if kind is not None:
+            found.setdefault(kind, tag)
+        elif token.isdigit():
+            if len(token) == 4 and token[:2] in ('19', '20'):
+                air_date = _air_date(token, tokens[i + 1:i + 3]) # "Show.2024.03.14"
+                if air_date is None:
+                    years.append(int(token))
+                elif 'air_date' not in found:
+                    found['air_date'] = air_date
+                    skip = 2
+                    if title_end is None:
+                        title_end = len(words)
+            elif after_dash and words and 'absolute_episode' not in found and _is_absolute_episode(token, bracketed):
+                found['absolute_episode'] = int(token) # "Show - 137"
+                if title_end is None:
+                    title_end = len(words)
+            else:
+                words.append(token)
+        elif len(token) == 10 and token[4] == token[7] == '-' and token[:4].isdigit() \
+                and _air_date(token[:4], [token[5:7], token[8:]]):
+            found.setdefault('air_date', _air_date(token[:4], [token[5:7], token[8:]])) # "Show 2024-03-14"
+            if title_end is None:
+                title_end = len(words)
+        else:
+            # Only tokens with digits can hold an episode number (e.g. "S01E02", "S01E02-GROUP")
+            match = EPISODE_PATTERN.search(lower) if 'season' not in found else None
+            if match:
+                found['season'], found['episode'] = int(match.group(1)), int(match.group(2))
+                if match.group(3) and int(match.group(3)) > found['episode']:
+                    found['last_episode'] = int(match.group(3))
+                rest = token[:match.start()].strip('-') # e.g. "Show-S01E02"
+                if rest:
+                    words.append(rest)
+                if title_end is None:
+                    title_end = len(words)
+            else:
+                words.append(token)
+
+    if title_end is not None:
+        del words[title_end:] # Drop the episode title: "Show.S01E02.Episode.Title.720p"
+    if not words and years:
+        # A title that is itself a year: "1917.2019.mkv", or a lone "2012.mkv"
+        words.append(str(years.pop(0)))
+    return ParsedName(" ".join(words), year=years[-1] if years else None, extension=extension, **found)
+
+
+# =============================================================================
+# Benchmark
+# =============================================================================
+
+BENCHMARK_TEMPLATES = (
+    "The.Matrix.{year}.{res}.BluRay.x264-GRP{n}.mkv",
+    "Breaking.Bad.S{season:02d}E{episode:02d}.{res}.WEB-DL.mkv",
+    "[Group] Some Anime Title {n} (1080p) [ABCD1234].mkv",
+    "Movie Title ({year}) [Director's Cut] {res}.mp4",
+    "show_name_s{season}e{episode}_hdtv_{n}.avi",
+)
+
+
+def benchmark(count):
+    """Parses `count` distinct synthetic filenames (bypassing the cache) and reports the rate."""
+    rng = random.Random(0)
+    names = [rng.choice(BENCHMARK_TEMPLATES).format(
+                 year=rng.randint(1950, 2024), res=rng.choice(("720p", "1080p", "2160p")), n=i,
+                 season=rng.randint(1, 20), episode=rng.randint(1, 24))
+             for i in range(count)]
+    start = time.perf_counter()
+    for name in names:
+        _parse(name)
+    elapsed = time.perf_counter() - start
+    print(f"Parsed {count:,} filenames in {elapsed:.2f}s "
+          f"({count / elapsed:,.0f} names/s, {elapsed / count * 1e6:.2f} us each)")
+    print(f"Example: {names[1]!r} -> {_parse(names[1])!r}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parse media filenames, or benchmark the parser.")
+    parser.add_argument('names', nargs='*', help="filenames to parse and print")
+    parser.add_argument('--benchmark', type=int, nargs='?', const=1_000_000, metavar='COUNT',
+                        help="time parsing COUNT synthetic filenames (default: 1,000,000)")
+    args = parser.parse_args(argv)
+    if args.benchmark:
+        benchmark(args.benchmark)
+    for name in args.names:
+        print(f"{name!r} -> {parse_name(name)!r}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,20 +4,38 @@ import re
 import shutil
 import logging
 import time
+import json
+import csv
+import sqlite3
+import threading
+import queue
+import select
+import struct
+import ctypes
+import ctypes.util
+import difflib
+import hashlib
+import math
+import argparse
+import signal
+import errno
+try:
+    import fcntl # Not available on Windows; reflink copies are skipped there
+except ImportError:
+    fcntl = None
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from types import SimpleNamespace
 
 # --- Third-party libraries ---
 # You need to install PyQt5 and tmdbv3api
 # pip install PyQt5 tmdbv3api
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                             QPushButton, QLabel, QLineEdit, QFileDialog, QMessageBox,
-                             QRadioButton, QCheckBox, QProgressBar, QTextEdit, QFrame,
-                             QScrollArea)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QObject
-from PyQt5.QtGui import QFont, QPalette, QColor, QPixmap, QTextCursor
-
+# PyQt5 is only needed for the GUI and is imported lazily (see Plex_Media_Sorter_GUI.py),
+# so the headless command line runs on servers without Qt installed.
 from tmdbv3api import TMDb, Movie, TV, Season, exceptions
 
+from Plex_Media_Sorter_Parser import parse_name
+
 # --- TMDb API Configuration ---
 # IMPORTANT: It's best practice to not hardcode API keys.
 # Consider using environment variables or a config file in a real-world app.
@@ -30,6 +48,95 @@ tmdb.wait_on_rate_limit = True
 tmdb.REQUEST_TIMEOUT = 30 # CORRECTED: Set timeout directly on the instance
 
 
+def _user_cache_dir():
+    """Returns the per-user cache directory used for persistent application data."""
+    if sys.platform.startswith('win'):
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'plex_media_sorter')
+
+
+# --- TMDb Rate Limiting ---
+# Requests are paced proactively so concurrent lookups stay just under TMDb's
+# limit; wait_on_rate_limit above remains as a backstop if a 429 slips through.
+TMDB_REQUESTS_PER_SECOND = 40
+TMDB_REQUEST_BURST = 20
+
+
+class TokenBucket:
+    """
+    A thread-safe token-bucket rate limiter. Each acquire() takes one token; tokens refill
+    at `rate` per second up to `capacity`. Callers that find the bucket empty reserve
+    the next free slot and sleep outside the lock, so waiting threads are served in order.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+# Shared by every TMDb call made by the sorter, across all worker threads
+tmdb_rate_limiter = TokenBucket(TMDB_REQUESTS_PER_SECOND, TMDB_REQUEST_BURST)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the request,
+    and callers arriving while it is in flight wait for and share its result or error.
+    """
+    def __init__(self):
+        self.coalesced = 0 # Number of calls that were served by another caller's request
+        self._lock = threading.Lock()
+        self._in_flight = {} # key -> [done event, result, error]
+
+    def do(self, key, request, *args):
+        with self._lock:
+            flight = self._in_flight.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._in_flight[key] = [threading.Event(), None, None]
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            flight[0].wait()
+            if flight[2] is not None:
+                raise flight[2]
+            return flight[1]
+
+        try:
+            flight[1] = request(*args)
+            return flight[1]
+        except Exception as e:
+            flight[2] = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            flight[0].set()
+
+
+# --- Persistent Cache Configuration ---
+CACHE_DIR = _user_cache_dir()
+CACHE_TTL_SECONDS = 30 * 24 * 60 * 60 # Cached TMDb responses expire after 30 days
+CACHE_EMPTY_TTL_SECONDS = 60 * 60 # Empty search results expire after an hour, as TMDb may list the title soon
+CACHE_MAX_ENTRIES = 50000 # Least recently used entries are evicted beyond this size
+UNDO_DIR = os.path.join(CACHE_DIR, "undo") # One undo manifest per sort run
+
+
 # =============================================================================
 # Core Sorting Logic (Now in a dedicated Worker Object)
 # =============================================================================
@@ -37,48 +144,1195 @@ tmdb.REQUEST_TIMEOUT = 30 # CORRECTED: Set timeout directly on the instance
 # Define constants for video extensions and stop words
 VIDEO_EXTENSIONS = {'.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv'}
 STOP_WORDS = {'a', 'an', 'the', 'and', 'in', 'on', 'of'}
+# "Season 2", "Seasons 1-3", "Series 4": words that only mark a season when a season number follows
+SEASON_WORDS = {'season', 'seasons', 'series'}
+# Folder-name words that describe a pack rather than the show itself, but only after a
+# season marker ("S01 Complete") or at the end of a "... Complete Series" name;
+# elsewhere they are part of the title ("The Pack", "A Series of Unfortunate Events")
+SEASON_FOLDER_WORDS = {'season', 'seasons', 'complete', 'series', 'pack'}
+# "S01", "S01E01", "S01-S03": season markers in a show folder name
+SEASON_MARKER_PATTERN = re.compile(r's\d{1,2}(?:e\d{1,3})?(?:-s?\d{1,2}(?:e\d{1,3})?)?')
+# A season number following a marker word: "Season 2", "Seasons 1-3"
+SEASON_NUMBER_PATTERN = re.compile(r'\d{1,2}(?:-\d{1,2})?')
+
+# Files flow through parse -> lookup -> plan -> execute stages joined by bounded
+# queues, so copies of resolved files overlap the TMDb lookups of the next ones.
+# A full queue makes the stage before it wait instead of buffering more files.
+LOOKUP_CONCURRENCY = 8 # Files whose TMDb lookups may run concurrently
+EXECUTE_CONCURRENCY = 4 # Copies/moves that may run concurrently in total
+DEVICE_CONCURRENCY = 2 # Copies/moves that may touch one disk (st_dev) at the same time
+PIPELINE_QUEUE_SIZE = 32 # Files buffered between two stages
+
+# Number of directories listed in parallel while scanning the source folder, and
+# how often (in files) the discovered count is reported while the scan runs
+SCAN_CONCURRENCY = 8
+SCAN_PROGRESS_EVERY = 200
+
+# Watch mode: a new file is processed once its size has not changed for
+# WATCH_SETTLE_SECONDS; sizes of files still being written are re-checked
+# every WATCH_POLL_SECONDS (the watcher sleeps indefinitely when nothing is pending)
+WATCH_SETTLE_SECONDS = 10
+WATCH_POLL_SECONDS = 2
+
+# The operation journal is fsync'd after JOURNAL_SYNC_EVERY records or
+# JOURNAL_SYNC_SECONDS, whichever comes first
+JOURNAL_SYNC_EVERY = 64
+JOURNAL_SYNC_SECONDS = 2.0
+
+# A candidate scoring at least this well against the filename ends the search early;
+# shorter search terms are only tried while no candidate reaches it
+SEARCH_CONFIDENT_SCORE = 0.9
+
+# The best candidate is selected without prompting when it scores at least
+# AUTO_SELECT_THRESHOLD and beats the runner-up by at least AUTO_SELECT_MARGIN
+AUTO_SELECT_THRESHOLD = 0.85
+AUTO_SELECT_MARGIN = 0.1
+
+# How long the worker waits for review decisions before leaving them for a later
+# session (None waits until the user answers or the sort is stopped)
+SELECTION_TIMEOUT_SECONDS = None
+
+# Attributes kept from TMDb result objects when they are cached.
+# Only these fields are used by the sorter and the selection pane.
+CACHED_MEDIA_FIELDS = ('id', 'name', 'original_name', 'first_air_date',
+                       'title', 'original_title', 'release_date',
+                       'popularity', 'vote_count')
+
+
+def _media_to_dict(item):
+    """Converts a TMDb result object into a plain, JSON-serializable dict."""
+    return {field: getattr(item, field) for field in CACHED_MEDIA_FIELDS if hasattr(item, field)}
+
+
+def _media_from_dict(data):
+    """Rebuilds an attribute-style media object from a cached dict."""
+    return SimpleNamespace(**data)
+
+
+class TMDbCache:
+    """
+    A persistent, thread-safe SQLite cache for TMDb responses.
+    Entries are keyed by (kind, key, language), expire after a TTL (empty results after
+    the shorter empty_ttl), and the least recently used entries are evicted once the
+    cache grows past max_entries.
+    """
+    EVICT_EVERY = 500 # Number of writes between eviction passes
+
+    def __init__(self, path=None, language='en', ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES,
+                 empty_ttl=CACHE_EMPTY_TTL_SECONDS):
+        self.language = language
+        self.ttl = ttl
+        self.empty_ttl = empty_ttl
+        self.max_entries = max_entries
+        self.stats = {} # kind -> [hits, misses]
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+
+        path = path or os.path.join(CACHE_DIR, 'tmdb_cache.sqlite3')
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+        except (OSError, sqlite3.Error) as e:
+            # Never let a broken cache stop a sort; fall back to a per-run cache.
+            logging.warning(f"Could not open TMDb cache at '{path}': {e}. Using an in-memory cache.")
+            self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    PRIMARY KEY (kind, key, language)
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed)")
+            self._evict()
+            self._conn.commit()
+
+    def get(self, kind, key):
+        """Returns the cached value for (kind, key), or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            counters = self.stats.setdefault(kind, [0, 0])
+            row = self._conn.execute(
+                "SELECT payload, created FROM responses WHERE kind = ? AND key = ? AND language = ?",
+                (kind, key, self.language)).fetchone()
+            if row is None or now - row[1] > (self.empty_ttl if row[0] == '[]' else self.ttl):
+                counters[1] += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed = ? WHERE kind = ? AND key = ? AND language = ?",
+                (now, kind, key, self.language))
+            self._conn.commit()
+            counters[0] += 1
+        return json.loads(row[0])
+
+    def set(self, kind, key, value):
+        """Stores a JSON-serializable value for (kind, key)."""
+        now = time.time()
+        payload = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (kind, key, language, payload, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, key, self.language, payload, now, now))
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= self.EVICT_EVERY:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drops expired entries, then trims the least recently used ones. Caller holds the lock."""
+        self._writes_since_evict = 0
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM responses WHERE rowid IN "
+                "(SELECT rowid FROM responses ORDER BY accessed ASC LIMIT ?)",
+                (count - self.max_entries,))
+            logging.debug(f"Evicted {count - self.max_entries} entries from the TMDb cache.")
+
+    def summary(self):
+        """Returns a one-line, human-readable summary of the hit/miss counts."""
+        hits = sum(h for h, _ in self.stats.values())
+        misses = sum(m for _, m in self.stats.values())
+        details = ", ".join(f"{kind} {h}/{m}" for kind, (h, m) in sorted(self.stats.items()))
+        return f"TMDb cache: {hits} hits, {misses} misses" + (f" ({details})" if details else "")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class UserDecision:
+    """
+    A one-shot handshake between the worker and the UI for a pending selection.
+    The worker blocks in wait() until the UI resolves it, it is cancelled, or the
+    timeout expires; no polling is involved.
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._resolved = False
+        self._cancelled = False
+        self.choice = None
+
+    def resolve(self, choice):
+        """Delivers the user's choice. Returns False if the request was already settled."""
+        with self._condition:
+            if self._resolved or self._cancelled:
+                return False
+            self.choice = choice
+            self._resolved = True
+            self._condition.notify_all()
+            return True
+
+    def cancel(self):
+        with self._condition:
+            self._cancelled = True
+            self._condition.notify_all()
+
+    def wait(self, timeout=None):
+        """Returns True once resolved, or False on cancellation or timeout."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._resolved or self._cancelled, timeout)
+            return self._resolved
+
+
+class ScanIndex:
+    """
+    A persistent record of every video file seen in the source folders (path, size, mtime,
+    inode and last outcome) plus each directory's mtime and subdirectories, so re-runs only
+    consider new or changed files. A directory whose mtime is unchanged and whose files are
+    all settled is not listed again; only its known subdirectories are visited.
+    Note that editing a file in place does not change its directory's mtime, so such a file
+    is only picked up again once something else in that directory changes.
+    """
+    # Outcomes that mean a file needs no further work while it is unchanged
+    SETTLED_OUTCOMES = ('copied', 'skipped')
+
+    def __init__(self, path=None):
+        self._lock = threading.Lock()
+        path = path or os.path.join(CACHE_DIR, 'scan_index.sqlite3')
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+        except (OSError, sqlite3.Error) as e:
+            logging.warning(f"Could not open scan index at '{path}': {e}. Every file will be scanned.")
+            self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    parent TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    outcome TEXT NOT NULL,
+                    updated REAL NOT NULL
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_files_parent ON files (parent)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS dirs (
+                    path TEXT PRIMARY KEY,
+                    mtime INTEGER NOT NULL,
+                    subdirs TEXT NOT NULL
+                )""")
+            self._conn.commit()
+
+    def unchanged_subdirs(self, path, mtime):
+        """
+        Returns (known subdirectories, settled file count) if `path` can be skipped (same
+        mtime as last listed and no unsettled files in it), or None if it must be listed again.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT mtime, subdirs FROM dirs WHERE path = ?", (path,)).fetchone()
+            if row is None or row[0] != mtime:
+                return None
+            outcomes = self._conn.execute(
+                "SELECT outcome FROM files WHERE parent = ?", (path,)).fetchall()
+        if any(outcome not in self.SETTLED_OUTCOMES for (outcome,) in outcomes):
+            return None
+        return json.loads(row[1]), len(outcomes)
+
+    def update_dir(self, path, mtime, subdirs, files):
+        """
+        Records a freshly listed directory. `files` holds (path, size, mtime, inode) for its
+        video files; returns the paths that are new or changed since they were last settled.
+        Entries for files that have disappeared from the directory are dropped.
+        """
+        now = time.time()
+        changed = []
+        with self._lock:
+            known = {row[0]: row[1:] for row in self._conn.execute(
+                "SELECT path, size, mtime, inode, outcome FROM files WHERE parent = ?", (path,))}
+            for file_path, size, file_mtime, inode in files:
+                previous = known.pop(file_path, None)
+                if previous and previous[:3] == (size, file_mtime, inode) and previous[3] in self.SETTLED_OUTCOMES:
+                    continue
+                changed.append(file_path)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO files (path, parent, size, mtime, inode, outcome, updated) "
+                    "VALUES (?, ?, ?, ?, ?, 'pending', ?)",
+                    (file_path, path, size, file_mtime, inode, now))
+            self._conn.executemany("DELETE FROM files WHERE path = ?", [(gone,) for gone in known])
+            self._conn.execute("INSERT OR REPLACE INTO dirs (path, mtime, subdirs) VALUES (?, ?, ?)",
+                               (path, mtime, json.dumps(subdirs)))
+            self._conn.commit()
+        return changed
+
+    def record_outcome(self, path, outcome):
+        """Stores the outcome of processing a file; files that are gone are forgotten."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        with self._lock:
+            if st is None:
+                self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO files (path, parent, size, mtime, inode, outcome, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (path, os.path.dirname(path), st.st_size, st.st_mtime_ns, st.st_ino, outcome, time.time()))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
 
 
-class SorterWorker(QObject):
+class OperationJournal:
     """
-    Handles the entire sorting process in a separate thread to keep the UI responsive.
-    Emits signals to communicate with the main UI thread.
+    An append-only JSON-lines journal of the file operations of a run, so a run that
+    crashed or was force-stopped can be resumed. Each operation gets a 'planned' record
+    (source, destination, size, source inode and mtime, method) and later a 'done', 'failed' or 'cancelled' one.
+    Records are fsync'd in batches, but a planned record is always on disk before its
+    operation starts.
     """
-    # --- Signals ---
-    # These signals are used to send data back to the main UI thread safely.
-    log_message = pyqtSignal(str)
-    total_progress_update = pyqtSignal(int, int) # max, value
-    file_progress_update = pyqtSignal(int, int) # max, value
-    fetching_progress_update = pyqtSignal(int, int) # max, value
-    
-    # Signal to request a user selection from a list of results
-    # Emits: list of media objects, media_type ('tv' or 'movie')
-    selection_needed = pyqtSignal(list, str) 
-    
-    # Signal to indicate the sorting process is finished
-    finished = pyqtSignal(bool) # True if stopped by user, False otherwise
-
-    def __init__(self, source_dir, dest_dir, sort_mode, keep_originals):
-        super().__init__()
+    FINISHED_STATUSES = ('done', 'failed', 'cancelled')
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._last_id = 0
+        self._synced_id = 0 # Highest operation id whose planned record is on disk
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+        self.open_operations = 0 # Planned but not yet finished
+
+    @classmethod
+    def read_unfinished(cls, path):
+        """Returns the planned records of a journal that never got a finishing record."""
+        planned = {}
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError: # A record torn by the crash
+                        continue
+                    if record.get('status') == 'planned':
+                        planned[record['id']] = record
+                    elif record.get('status') in cls.FINISHED_STATUSES:
+                        planned.pop(record.get('id'), None)
+        except FileNotFoundError:
+            pass
+        return list(planned.values())
+
+    def plan(self, operation):
+        """Journals a planned operation and stores its journal id on it."""
+        with self._lock:
+            self._last_id += 1
+            operation.journal_id = self._last_id
+            self.open_operations += 1
+            self._append({'id': self._last_id, 'status': 'planned', 'source': operation.source,
+                          'destination': operation.destination, 'temp': operation.temp_path,
+                          'size': operation.size, 'inode': operation.source_inode,
+                          'mtime_ns': operation.source_mtime_ns, 'method': operation.method, 'time': time.time()})
+
+    def ensure_synced(self, operation):
+        """Blocks until the planned record of `operation` is durable."""
+        with self._lock:
+            if self._synced_id < operation.journal_id:
+                self._sync()
+
+    def finish(self, operation, status, method=None):
+        if operation.journal_id is None: # Never journaled (dry run)
+            return
+        with self._lock:
+            self.open_operations -= 1
+            self._append({'id': operation.journal_id, 'status': status, 'method': method or operation.method})
+
+    def _append(self, record):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(record) + "\n")
+        self._unsynced += 1
+        if self._unsynced >= JOURNAL_SYNC_EVERY or time.monotonic() - self._synced_at >= JOURNAL_SYNC_SECONDS:
+            self._sync()
+
+    def _sync(self):
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._synced_id = self._last_id
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def close(self):
+        """Closes the journal, deleting it when every operation has finished."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._sync()
+            self._file.close()
+            self._file = None
+            if self.open_operations == 0:
+                os.remove(self.path)
+
+
+class UndoManifest:
+    """
+    A JSON-lines record of every file a run placed in the library, used by --rollback
+    to reverse the run. The first line describes the run; each following line holds
+    one operation's source, destination, size, method and whether the original was kept.
+    The file is only created once the first operation completes.
+    """
+    def __init__(self, path, source_dir, dest_dir):
+        self.path = path
         self.source_dir = source_dir
         self.dest_dir = dest_dir
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = None
+
+    def record(self, operation, method):
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, 'w', encoding='utf-8')
+                self._file.write(json.dumps({'run': os.path.basename(self.path), 'source_dir': self.source_dir,
+                                             'dest_dir': self.dest_dir}) + "\n")
+            self._file.write(json.dumps({'source': operation.source, 'destination': operation.destination,
+                                         'size': operation.size, 'method': method,
+                                         'kept': operation.keep_original}) + "\n")
+            self._file.flush()
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+
+# Columns of a saved operation plan (one row per file in CSV plans)
+PLAN_FIELDS = ('source', 'destination', 'method', 'size')
+PLAN_FOLDERS_MARKER = '# folders' # First cell of the CSV plan row holding the source and destination folders
+
+
+def write_plan(path, source_dir, dest_dir, operations):
+    """
+    Saves the operations of a dry run as CSV (for a .csv path) or JSON (otherwise).
+    Plans can be reviewed or edited and later executed with --apply-plan. All paths are
+    stored absolute, so a plan can be applied from any directory.
+    """
+    source_dir, dest_dir = os.path.abspath(source_dir), os.path.abspath(dest_dir)
+    rows = [{'source': os.path.abspath(op.source), 'destination': os.path.abspath(op.destination),
+             'method': op.method, 'size': op.size}
+            for op in operations]
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8', newline='') as f:
+        if path.lower().endswith('.csv'):
+            csv.writer(f).writerow([PLAN_FOLDERS_MARKER, source_dir, dest_dir])
+            writer = csv.DictWriter(f, fieldnames=PLAN_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            json.dump({'source_dir': source_dir, 'dest_dir': dest_dir, 'created': datetime.now().isoformat(),
+                       'operations': rows}, f, indent=1)
+    os.replace(temp_path, path)
+
+
+def read_plan(path):
+    """
+    Loads a plan saved by write_plan. Returns (source_dir, dest_dir, rows).
+    """
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.lower().endswith('.csv'):
+            folders = next(csv.reader(f), [])
+            if len(folders) != 3 or folders[0] != PLAN_FOLDERS_MARKER:
+                raise ValueError(f"plan '{path}' does not record its source and destination folders; "
+                                 f"create it again with --dry-run.")
+            _, source_dir, dest_dir = folders
+            rows = list(csv.DictReader(f))
+        else:
+            plan = json.load(f)
+            rows, source_dir, dest_dir = plan['operations'], plan['source_dir'], plan['dest_dir']
+    for row in rows:
+        if row['method'] not in TRANSFER_METHODS:
+            raise ValueError(f"Unknown method '{row['method']}' for '{row['source']}' in plan '{path}'.")
+    return source_dir, dest_dir, rows
+
+
+def latest_undo_manifest():
+    """Returns the path of the most recent run's undo manifest, or None."""
+    try:
+        names = sorted(name for name in os.listdir(UNDO_DIR) if name.endswith('.jsonl'))
+    except FileNotFoundError:
+        return None
+    return os.path.join(UNDO_DIR, names[-1]) if names else None
+
+
+def rollback_run(manifest_path, log=print, scan_index=None):
+    """
+    Reverses the run recorded in an undo manifest, newest operation first. Moved files
+    are renamed back (copied back only across filesystems) and kept-original copies are
+    deleted, unless the original has gone since, in which case the copy is moved back
+    instead. Files changed or replaced since the run are left alone. Library folders
+    emptied by the rollback are removed. The manifest is rewritten to hold only the
+    skipped operations, so the rollback can be retried. Returns (reverted, skipped) counts.
+    """
+    with open(manifest_path, encoding='utf-8') as f:
+        header, *entries = [json.loads(line) for line in f if line.strip()]
+    dest_root = os.path.abspath(header['dest_dir'])
+    reverted = 0
+    remaining = [] # Skipped entries, newest first
+    for entry in reversed(entries):
+        source, destination = entry['source'], entry['destination']
+        try:
+            if not os.path.exists(destination):
+                log(f"  Skipped '{destination}': it is no longer in the library.")
+                remaining.append(entry)
+                continue
+            if os.path.getsize(destination) != entry['size']:
+                log(f"  Skipped '{destination}': it has changed since the sort.")
+                remaining.append(entry)
+                continue
+            if entry['kept'] and os.path.isfile(source) and os.path.getsize(source) == entry['size']:
+                os.remove(destination) # The original is still in the source folder
+            else: # Moved, or a copy whose original was cleaned up since: the library holds the only copy
+                if os.path.lexists(source):
+                    log(f"  Skipped '{destination}': '{source}' exists again.")
+                    remaining.append(entry)
+                    continue
+                os.makedirs(os.path.dirname(source), exist_ok=True)
+                try:
+                    os.rename(destination, source)
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        raise
+                    copy_file(destination, source)
+                    os.remove(destination)
+        except OSError as e:
+            log(f"  Could not roll back '{destination}': {e}")
+            logging.error(f"Rollback of '{destination}' -> '{source}' failed: {e}", exc_info=True)
+            remaining.append(entry)
+            continue
+
+        reverted += 1
+        if scan_index:
+            scan_index.record_outcome(source, 'rolled_back') # Sorted again by the next run
+        # Remove the Season/show/year folders the sort created, once empty
+        folder = os.path.dirname(os.path.abspath(destination))
+        while folder != dest_root and folder.startswith(dest_root + os.sep):
+            try:
+                os.rmdir(folder)
+            except OSError:
+                break
+            folder = os.path.dirname(folder)
+
+    if remaining and reverted:
+        temp_path = manifest_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for record in [header] + remaining[::-1]:
+                f.write(json.dumps(record) + "\n")
+        os.replace(temp_path, manifest_path)
+    return reverted, len(remaining)
+
+
+class MediaScanner:
+    """
+    Walks a source tree with os.scandir, listing subdirectories in parallel, and streams
+    video files as they are found so identification can start before the walk finishes.
+    Iterate over the scanner to receive full paths; call close() to abandon the walk early.
+    """
+    _DONE = object() # Queue sentinel: every directory has been listed
+
+    def __init__(self, root, exclude_dirs=(), workers=SCAN_CONCURRENCY, on_progress=None, index=None):
+        self.root = os.path.abspath(root)
+        self.exclude_dirs = {os.path.realpath(path) for path in exclude_dirs if path}
+        self.workers = max(1, workers)
+        self.on_progress = on_progress # Called with the running count of discovered files
+        self.index = index # Optional ScanIndex used to skip unchanged files and folders
+        self.discovered = 0
+        self.unchanged_files = 0 # Files skipped because the index already settled them
+        self.unchanged_dirs = 0 # Folders not listed because their mtime was unchanged
+        self._results = queue.Queue()
+        self._lock = threading.Lock()
+        self._outstanding = 0 # Directories submitted but not yet listed
+        self._closed = False
+        self._executor = None
+
+    def __iter__(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="Scan")
+        self._submit(self.root)
+        try:
+            while True:
+                item = self._results.get()
+                if item is self._DONE:
+                    break
+                yield item
+        finally:
+            self.close()
+        if self.on_progress:
+            self.on_progress(self.discovered)
+
+    def close(self):
+        """Stops listing further directories and releases the scan threads."""
+        self._closed = True
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, path, mtime=None):
+        with self._lock:
+            self._outstanding += 1
+        try:
+            self._executor.submit(self._scan_dir, path, mtime)
+        except RuntimeError: # Executor already shut down by close()
+            self._finish_dir()
+
+    def _finish_dir(self):
+        with self._lock:
+            self._outstanding -= 1
+            finished = self._outstanding == 0
+        if finished:
+            self._results.put(self._DONE)
+
+    def _scan_dir(self, path, mtime=None):
+        try:
+            if self._closed:
+                return
+            if self.index:
+                if mtime is None:
+                    mtime = os.stat(path).st_mtime_ns
+                unchanged = self.index.unchanged_subdirs(path, mtime)
+                if unchanged is not None:
+                    known_subdirs, settled_files = unchanged
+                    with self._lock:
+                        self.unchanged_dirs += 1
+                        self.unchanged_files += settled_files
+                    for subdir in known_subdirs:
+                        if os.path.isdir(subdir):
+                            self._submit(subdir)
+                    return
+
+            subdirs, files = [], []
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if os.path.realpath(entry.path) not in self.exclude_dirs:
+                                subdirs.append(entry.path)
+                                self._submit(entry.path, entry.stat(follow_symlinks=False).st_mtime_ns)
+                        elif os.path.splitext(entry.name)[1].lower() in VIDEO_EXTENSIONS:
+                            if self.index:
+                                st = entry.stat()
+                                files.append((entry.path, st.st_size, st.st_mtime_ns, st.st_ino))
+                            else:
+                                self._results.put(entry.path)
+                                self._count_file()
+                    except OSError as e:
+                        logging.warning(f"Could not inspect '{entry.path}' while scanning: {e}")
+
+            if self.index:
+                changed = self.index.update_dir(path, mtime, subdirs, files)
+                with self._lock:
+                    self.unchanged_files += len(files) - len(changed)
+                for file_path in changed:
+                    self._results.put(file_path)
+                    self._count_file()
+        except OSError as e:
+            logging.warning(f"Could not list directory '{path}' while scanning: {e}")
+        finally:
+            self._finish_dir()
+
+    def _count_file(self):
+        with self._lock:
+            self.discovered += 1
+            discovered = self.discovered
+        if self.on_progress and discovered % SCAN_PROGRESS_EVERY == 0:
+            self.on_progress(discovered)
+
+
+class InotifyWatcher:
+    """
+    Watches a directory tree for new or finished files using Linux inotify (through ctypes,
+    so no extra dependency is needed). New subdirectories are watched as they appear.
+    read_events() blocks in select() with no polling until something happens or wake()
+    is called from another thread.
+    """
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_ONLYDIR
+    _EVENT_HEADER = struct.Struct('iIII') # wd, mask, cookie, name length
+
+    def __init__(self, root, exclude_dirs=()):
+        if not sys.platform.startswith('linux'):
+            raise OSError("Watch mode requires Linux inotify.")
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 failed: {os.strerror(err)}")
+        self._wake_read, self._wake_write = os.pipe()
+        self.root = os.path.abspath(root)
+        self.exclude_dirs = {os.path.realpath(path) for path in exclude_dirs if path}
+        self.overflowed = False # Set when the kernel dropped events; callers should rescan
+        self._watches = {} # watch descriptor -> directory path
+        self._add_tree(self.root)
+
+    def _add_tree(self, top):
+        """Watches `top` and every directory below it. Returns video files already inside."""
+        found = []
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames[:] = [d for d in dirnames if os.path.realpath(os.path.join(dirpath, d)) not in self.exclude_dirs]
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), self.WATCH_MASK)
+            if wd < 0:
+                logging.warning(f"Could not watch '{dirpath}': {os.strerror(ctypes.get_errno())}")
+                continue
+            self._watches[wd] = dirpath
+            found.extend(os.path.join(dirpath, f) for f in filenames
+                         if os.path.splitext(f)[1].lower() in VIDEO_EXTENSIONS)
+        return found
+
+    def read_events(self, timeout=None):
+        """
+        Waits up to `timeout` seconds (forever if None) and returns the video file paths that
+        were created, finished writing, or moved in. Returns [] on timeout or wake().
+        """
+        readable, _, _ = select.select([self._fd, self._wake_read], [], [], timeout)
+        if self._wake_read in readable:
+            os.read(self._wake_read, 4096)
+        if self._fd not in readable:
+            return []
+
+        paths = []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_len = self._EVENT_HEADER.unpack_from(data, offset)
+            offset += self._EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_len].rstrip(b'\0'))
+            offset += name_len
+
+            if mask & self.IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            directory = self._watches.get(wd)
+            if mask & self.IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO) and os.path.realpath(path) not in self.exclude_dirs:
+                    # A whole folder may have been moved in; pick up what is already inside
+                    paths.extend(self._add_tree(path))
+            elif os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS:
+                paths.append(path)
+        return paths
+
+    def wake(self):
+        """Interrupts a blocking read_events() call from another thread."""
+        try:
+            os.write(self._wake_write, b'x')
+        except OSError:
+            pass
+
+    def close(self):
+        for fd in (self._fd, self._wake_read, self._wake_write):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class FileLookup:
+    """The result of the lookup stage for one file, handed to the file-operation stage."""
+    def __init__(self, full_path):
+        self.full_path = full_path
+        self.filename = os.path.basename(full_path)
+        self.parsed = parse_name(self.filename) # Title, year, SxxExx and release tags
+        self.is_tv_show_file = False
+        self.media_type = ""
+        self.search_term = ""
+        self.show_folder = None
+        self.show_title = "" # Show folder title without season markers, used as the TV search term
+        self.show_title_key = None
+        self.selected_media = None
+        self.year = None # Release/first-air year parsed from the name, if any
+        self.candidates = []
+        self.scores = {} # TMDb id -> match score against the parsed name
+        self.skipped = False
+        self.messages = [] # UI log lines, emitted when the file is processed
+
+    def log(self, message):
+        self.messages.append(message)
+
+
+# How the execute stage places a file, and the label used for it in the Action Log.
+# 'rename' and 'hardlink' only touch metadata and need source and destination on one filesystem.
+TRANSFER_METHODS = {
+    'rename': "Renaming and moving",
+    'move': "Renaming and moving", # Across filesystems: copy, then delete the original
+    'hardlink': "Hardlinking",
+    'copy': "Copying",
+}
+
+
+class FileOperation:
+    """A copy or move decided by the plan stage, handed to the execute stage."""
+    def __init__(self, source, destination, method, source_device, dest_device, source_stat):
+        self.source = source
+        self.destination = destination
+        self.method = method # A TRANSFER_METHODS key
+        self.source_device = source_device
+        self.dest_device = dest_device
+        self.size = source_stat.st_size
+        # Identify the destination as this operation's output after a crash: renames and
+        # hardlinks keep the inode, copies keep the modification time (copystat)
+        self.source_inode = (source_stat.st_dev, source_stat.st_ino)
+        self.source_mtime_ns = source_stat.st_mtime_ns
+        self.journal_id = None # Assigned when the operation is journaled
+        # Unique per operation, so two files planned to one destination never share a temp file
+        self.temp_path = f"{destination}.{os.urandom(4).hex()}.partial"
+        self.waits_for = None # An earlier operation with the same destination, which must finish first
+        self.finished = threading.Event()
+
+    @property
+    def keep_original(self):
+        return self.method in ('copy', 'hardlink')
+
+
+class DeviceLimiter:
+    """
+    Caps the number of concurrent file operations per storage device, so copies spread
+    across the disks of an array without several of them thrashing one spindle.
+    """
+    def __init__(self, per_device=DEVICE_CONCURRENCY):
+        self.per_device = max(1, per_device)
+        self._lock = threading.Lock()
+        self._semaphores = {} # st_dev -> BoundedSemaphore
+
+    def device_of(self, path):
+        """Returns the st_dev of `path`, or of its nearest existing parent if it does not exist yet."""
+        while True:
+            try:
+                return os.stat(path).st_dev
+            except FileNotFoundError:
+                parent = os.path.dirname(path)
+                if parent == path:
+                    raise
+                path = parent
+
+    def acquire(self, *devices):
+        """Takes a slot on every distinct device, in a fixed order so two operations cannot deadlock."""
+        semaphores = []
+        for device in sorted(set(devices)):
+            with self._lock:
+                semaphore = self._semaphores.setdefault(device, threading.BoundedSemaphore(self.per_device))
+            semaphore.acquire()
+            semaphores.append(semaphore)
+        return semaphores
+
+    def release(self, semaphores):
+        for semaphore in reversed(semaphores):
+            semaphore.release()
+
+
+# --- Copy Engine ---
+# Copies try, in order: a reflink (FICLONE; instant and space-sharing on Btrfs/XFS),
+# an in-kernel copy_file_range, then sendfile, and finally a plain userspace copy.
+# Each in-kernel step copies COPY_CHUNK_SIZE bytes per call.
+FICLONE = 0x40049409
+COPY_CHUNK_SIZE = 32 * 2**20
+# Copy progress reaches the progress bar at most every PROGRESS_INTERVAL_SECONDS; copies
+# still running after PROGRESS_LOG_SECONDS log their throughput and ETA at that interval
+PROGRESS_INTERVAL_SECONDS = 0.5
+PROGRESS_LOG_SECONDS = 10
+# Errors meaning "this method is not supported here", so the next one is tried
+COPY_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP,
+                        errno.ENOTTY, errno.EPERM, errno.EBADF, errno.ETXTBSY, errno.ENOTSOCK}
+
+
+def copy_file(source, destination, on_progress=None):
+    """
+    Copies file data and metadata like shutil.copy2, using the fastest method the
+    filesystems allow. `on_progress(bytes_copied)` is called after every chunk.
+    Returns the name of the method that copied the data. The destination must not
+    exist yet: opening an existing name could truncate a hardlink of the source.
+    """
+    with open(source, 'rb') as src, open(destination, 'xb') as dst:
+        size = os.fstat(src.fileno()).st_size
+        method = _copy_data(src, dst, size, on_progress or (lambda copied: None))
+    shutil.copystat(source, destination)
+    return method
+
+
+def _copy_data(src, dst, size, on_progress):
+    """Copies `size` bytes between open files. A method that fails part-way hands over at the same offset."""
+    src_fd, dst_fd = src.fileno(), dst.fileno()
+    if fcntl and size:
+        try:
+            fcntl.ioctl(dst_fd, FICLONE, src_fd)
+            on_progress(size)
+            return 'reflink'
+        except OSError as e:
+            if e.errno not in COPY_FALLBACK_ERRNOS:
+                raise
+
+    offset = 0
+    for method in ('copy_file_range', 'sendfile'):
+        if not hasattr(os, method):
+            continue
+        try:
+            while offset < size:
+                count = min(COPY_CHUNK_SIZE, size - offset)
+                if method == 'copy_file_range':
+                    copied = os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+                else:
+                    os.lseek(dst_fd, offset, os.SEEK_SET)
+                    copied = os.sendfile(dst_fd, src_fd, offset, count)
+                if copied == 0: # Short of `size`: let the next method carry on from this offset
+                    break
+                offset += copied
+                on_progress(offset)
+            if offset >= size:
+                return method
+        except OSError as e:
+            if e.errno not in COPY_FALLBACK_ERRNOS:
+                raise
+
+    src.seek(offset)
+    dst.seek(offset)
+    while True:
+        chunk = src.read(COPY_CHUNK_SIZE)
+        if not chunk:
+            break
+        dst.write(chunk)
+        offset += len(chunk)
+        on_progress(offset)
+    return 'copy'
+
+
+def format_duration(seconds):
+    """Formats a duration for the Action Log, e.g. '1h 02m', '4m 05s' or '12s'."""
+    if seconds is None:
+        return "unknown"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class CopyProgress:
+    """Bytes copied so far for one file, sampled for throughput and ETA reporting."""
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.done = 0
+        self._sampled_at = time.monotonic()
+        self._sampled_done = 0
+
+    def sample(self, interval):
+        """
+        Returns (bytes/sec since the previous sample, ETA in seconds) once `interval`
+        seconds have passed since that sample, otherwise None.
+        """
+        now = time.monotonic()
+        elapsed = now - self._sampled_at
+        if elapsed < interval:
+            return None
+        rate = (self.done - self._sampled_done) / elapsed
+        self._sampled_at, self._sampled_done = now, self.done
+        return rate, ((self.size - self.done) / rate if rate else None)
+
+
+class TransferStats:
+    """Aggregate bytes written by concurrent file operations, for throughput reporting."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.files = 0
+            self.bytes = 0
+            self.methods = {} # copy method -> files copied with it
+            self._started = None
+            self._last = None
+
+    def start(self):
+        with self._lock:
+            if self._started is None:
+                self._started = time.monotonic()
+
+    def add(self, size, method):
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+            self.methods[method] = self.methods.get(method, 0) + 1
+            self._last = time.monotonic()
+
+    def rate(self):
+        """Aggregate bytes per second from the first transfer start to the latest completion."""
+        with self._lock:
+            if self._started is None or self._last is None:
+                return 0.0
+            return self.bytes / max(self._last - self._started, 1e-6)
+
+    def summary(self):
+        elapsed = (self._last - self._started) if self._started is not None and self._last is not None else 0.0
+        methods = ", ".join(f"{method} {count}" for method, count in sorted(self.methods.items()))
+        return (f"Transferred {self.bytes / 2**20:.1f} MiB in {self.files} file(s) over {elapsed:.1f}s "
+                f"({self.rate() / 2**20:.1f} MiB/s aggregate; {methods})")
+
+
+class PipelineStage:
+    """
+    One stage of the sorting pipeline: `workers` threads calling `handler` on items taken
+    from a bounded queue. Results other than None are put on `next_stage`, and a full
+    queue blocks the stage upstream (backpressure). close() ends the stage once drained,
+    and the last worker to exit closes the next stage in turn.
+    """
+    _END = object()
+
+    def __init__(self, name, handler, workers=1, capacity=PIPELINE_QUEUE_SIZE, next_stage=None):
+        self.name = name
+        self.handler = handler
+        self.next_stage = next_stage
+        self._queue = queue.Queue(maxsize=capacity)
+        self._lock = threading.Lock()
+        self._active = workers
+        self._threads = [threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def put(self, item):
+        self._queue.put(item)
+
+    def close(self):
+        """Signals that no more items will be put."""
+        self._queue.put(self._END)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is self._END:
+                self._queue.put(self._END) # Let the sibling workers see it too
+                break
+            try:
+                result = self.handler(item)
+            except Exception as e:
+                logging.error(f"Unhandled error in the {self.name} stage: {e}", exc_info=True)
+                continue
+            if result is not None and self.next_stage:
+                self.next_stage.put(result)
+
+        with self._lock:
+            self._active -= 1
+            last = self._active == 0
+        if last and self.next_stage:
+            self.next_stage.close()
+
+
+class Signal:
+    """
+    A minimal stand-in for pyqtSignal so SorterWorker runs without Qt. Connected callbacks
+    are called synchronously on the emitting thread; the GUI bridges them to Qt signals.
+    """
+    def __init__(self):
+        self._callbacks = []
+
+    def connect(self, callback):
+        self._callbacks.append(callback)
+
+    def emit(self, *args):
+        for callback in list(self._callbacks):
+            callback(*args)
+
+
+class SorterWorker:
+    """
+    Handles the entire sorting process, normally in a separate thread.
+    Reports progress through Signal callbacks, which work with or without a UI.
+    """
+
+    def __init__(self, source_dir, dest_dir, sort_mode, keep_originals, lookup_concurrency=LOOKUP_CONCURRENCY,
+                 auto_select_threshold=AUTO_SELECT_THRESHOLD, selection_timeout=SELECTION_TIMEOUT_SECONDS,
+                 use_scan_index=True, watch=False, execute_concurrency=EXECUTE_CONCURRENCY,
+                 device_concurrency=DEVICE_CONCURRENCY, hardlink_originals=False, dry_run_plan=None,
+                 saved_plan=None):
+        # --- Signals ---
+        # The GUI re-emits these as Qt signals so they reach the main UI thread safely.
+        self.log_message = Signal() # (str)
+        self.total_progress_update = Signal() # (max, value)
+        self.file_progress_update = Signal() # (max, value)
+        self.fetching_progress_update = Signal() # (max, value)
+
+        # Requests the user's decisions for all deferred ambiguous matches at once
+        # Emits: list of review items (dicts with 'label', 'media_type', 'files' and 'candidates')
+        self.selection_needed = Signal()
+
+        # Indicates the sorting process is finished
+        self.finished = Signal() # (bool) True if stopped by user, False otherwise
+
+        # Absolute, so the journal, undo manifest and dry-run plans work from any directory
+        self.source_dir = os.path.abspath(source_dir)
+        self.dest_dir = os.path.abspath(dest_dir)
         self.sort_mode = sort_mode
         self.keep_originals = keep_originals
+        self.hardlink_originals = hardlink_originals # Hardlink instead of copying when on the same filesystem
+        self.lookup_concurrency = max(1, lookup_concurrency)
+        self.execute_concurrency = max(1, execute_concurrency)
+        self.device_limiter = DeviceLimiter(device_concurrency)
+        self.transfer_stats = TransferStats()
+        self._active_copies = set() # CopyProgress of the copies running right now
+        self._progress_emitted_at = 0.0
+        self.auto_select_threshold = auto_select_threshold # None always prompts on multiple results
+        self.selection_timeout = selection_timeout
+        self.scan_index = ScanIndex() if use_scan_index else None # None processes every file
+        self.watch = watch # Keep watching the source folder for new files after the initial sort
+        self._initial_sort_files = {} # Watch mode: path -> (size, mtime) of files the initial scan sorted
+        self.dry_run_plan = dry_run_plan # Write the planned operations here instead of touching files
+        self.saved_plan = saved_plan # Execute this saved plan instead of scanning and looking up
+        self.planned_operations = [] # Collected by a dry run
+        self._watcher = None
         
         self.is_running = True
-        self.user_choice = None
+        self._pending_decision = None # UserDecision the UI is currently asked to resolve
         self.tv_search = TV()
         self.movie_search = Movie()
         self.folder_cache = {}
+        self.season_cache = {} # (show id, season number) -> season info
+        self.show_cache = {} # TMDb show id -> detailed show object
+        self.show_title_ids = {} # normalized show title -> TMDb show id
+        self.air_date_episodes = {} # TMDb show id -> {air date: (season, episode)}, filled season by season
+        self._refreshed = set() # ('tv_details', show id) and ('season', show id, season) refetched this run
+        self.cache = TMDbCache(language=tmdb.language)
+        self.single_flight = SingleFlight()
+        self._progress_lock = threading.Lock()
+        self._destination_owners = {} # destination -> the last unfinished operation planned to it
+        self._files_discovered = 0
+        self._files_processed = 0
+        self._lookups_done = 0
+        self.interactive = True # False when no UI is attached to answer review requests
+        self.review_queue = {} # review key -> deferred ambiguous item
+        self.queued_paths = set() # Every file in the review queue, for O(1) membership checks
+        source_key = hashlib.sha1(os.path.abspath(source_dir).encode()).hexdigest()[:12]
+        self.review_queue_path = os.path.join(CACHE_DIR, f"review_queue_{source_key}.json")
+        self.journal = OperationJournal(os.path.join(CACHE_DIR, f"journal_{source_key}.jsonl"))
+        self.undo = UndoManifest(os.path.join(UNDO_DIR, f"{datetime.now():%Y%m%d-%H%M%S-%f}_{source_key}.jsonl"),
+                                 source_dir, dest_dir)
 
     def run(self):
         """Main entry point for the worker thread."""
         logging.info("Worker thread started.")
         try:
-            self.sort_media_files()
+            if self.saved_plan:
+                self.apply_saved_plan()
+            else:
+                self.sort_media_files()
+                if self.dry_run_plan:
+                    self._write_dry_run_plan()
         except Exception as e:
             logging.critical(f"An unhandled exception occurred in the worker thread: {e}", exc_info=True)
             self.log_message.emit(f"CRITICAL ERROR: {e}. Check log file for details.")
+
+        summary = self.cache.summary()
+        if self.single_flight.coalesced:
+            summary += f"; {self.single_flight.coalesced} duplicate in-flight requests coalesced"
+        self.log_message.emit(f"\n{summary}")
+        logging.info(summary)
+        self.cache.close()
+        self.journal.close()
+        self.undo.close()
+        if self.undo.count:
+            self.log_message.emit(f"Undo manifest for this run: {self.undo.path}")
+            logging.info(f"Wrote undo manifest '{self.undo.path}' ({self.undo.count} operations).")
+        if self.scan_index:
+            self.scan_index.close()
         
         # Check if the process was stopped by the user or completed naturally
         stopped_by_user = not self.is_running
@@ -88,27 +1342,287 @@ class SorterWorker(QObject):
     def stop(self):
         """Stops the sorting process."""
         self.is_running = False
-        # If we are waiting for a user choice, we must set it to something
-        # to unblock the worker loop.
-        if self.user_choice is None:
-            self.user_choice = "skip"
+        # If we are waiting for a user choice, wake the worker up immediately.
+        decision = self._pending_decision
+        if decision:
+            decision.cancel()
+        watcher = self._watcher
+        if watcher:
+            watcher.wake()
         logging.info("Stop signal received by worker.")
 
+    def transfers_in_progress(self):
+        """Returns the number of file transfers running right now."""
+        with self._progress_lock:
+            return len(self._active_copies)
+
     def set_user_choice(self, choice):
         """Receives the user's selection from the main thread."""
-        self.user_choice = choice
-        logging.debug(f"Worker received user choice: {choice}")
+        decision = self._pending_decision
+        if decision and decision.resolve(choice):
+            logging.debug(f"Worker received user choice: {choice}")
+        else:
+            logging.debug(f"Ignoring user choice with no pending selection: {choice}")
     
-    def _clean_filename_for_search(self, filename):
-        """Cleans the filename to get a better search query."""
-        name = os.path.splitext(filename)[0]
-        name = re.sub(r'[sS]\d{1,2}[eE]\d{1,2}', '', name)
-        name = re.sub(r'\(?(19\d{2}|20\d{2})\)?', '', name)
-        name = re.sub(r'\[.*?\]', '', name)
-        name = re.sub(r'\(.*?\)', '', name)
-        name = re.sub(r'\b(1080p|720p|480p|dvdrip|x264|bluray|web-dl|webrip)\b', '', name, flags=re.IGNORECASE)
-        name = name.replace('.', ' ').replace('_', ' ')
-        return name.strip()
+    def _normalize_title(self, title):
+        """Lowercases a title and reduces punctuation to single spaces for comparison."""
+        title = title.lower().replace('&', ' and ')
+        return " ".join(re.sub(r'[^a-z0-9]+', ' ', title).split())
+
+    def _score_candidate(self, item, query, year, media_type):
+        """
+        Scores how well a TMDb result matches the cleaned name (0.0 - 1.0). Title similarity
+        is adjusted by agreement with the year parsed from the filename, whether the result
+        is of the expected media type, and a small popularity tie-breaker.
+        """
+        query = self._normalize_title(query)
+        titles = [getattr(item, field, None) for field in ('title', 'name', 'original_title', 'original_name')]
+        score = max((difflib.SequenceMatcher(None, query, self._normalize_title(title)).ratio()
+                     for title in titles if title), default=0.0)
+
+        date = getattr(item, 'release_date', None) or getattr(item, 'first_air_date', None)
+        item_year = int(date[:4]) if date and date[:4].isdigit() else None
+        if year and item_year:
+            if item_year == year:
+                score = score * 0.8 + 0.2
+            elif abs(item_year - year) == 1: # Regional release dates often differ by a year
+                score = score * 0.8 + 0.1
+            else:
+                score *= 0.8
+
+        item_type = 'tv' if hasattr(item, 'first_air_date') or hasattr(item, 'name') else 'movie'
+        if item_type != media_type:
+            score *= 0.5
+
+        # Popularity only separates otherwise similar results: at most +0.05 (popularity ~1000)
+        popularity = getattr(item, 'popularity', None) or 0
+        score += 0.05 * min(1.0, math.log10(1 + popularity) / 3)
+        return min(score, 1.0)
+
+    def _auto_select(self, lookup):
+        """Returns the best candidate when it is a clear winner, or None if the user must decide."""
+        if self.auto_select_threshold is None or len(lookup.candidates) < 2:
+            return None
+        best, runner_up = lookup.candidates[0], lookup.candidates[1]
+        best_score, runner_up_score = lookup.scores[best.id], lookup.scores[runner_up.id]
+        if best_score >= self.auto_select_threshold and best_score - runner_up_score >= AUTO_SELECT_MARGIN:
+            return best
+        return None
+
+    def _tmdb_request(self, request, *args):
+        """Performs a TMDb API call once the shared rate limiter allows it."""
+        tmdb_rate_limiter.acquire()
+        return request(*args)
+
+    def _search(self, media_type, term):
+        """
+        Searches TMDb for a term, serving previously seen terms from the persistent cache.
+        Identical searches already in flight on another thread are waited on instead.
+        Returns a list of media objects.
+        """
+        key = " ".join(term.lower().split())
+        return self.single_flight.do(('search', media_type, key), self._load_search, media_type, key)
+
+    def _load_search(self, media_type, key):
+        kind = f"search_{media_type}"
+        cached = self.cache.get(kind, key)
+        if cached is not None:
+            logging.debug(f"Cache hit for {media_type} search '{key}': {len(cached)} results.")
+            return [_media_from_dict(data) for data in cached]
+
+        if media_type == 'tv':
+            results = self._tmdb_request(self.tv_search.search, key)
+        else:
+            results = self._tmdb_request(self.movie_search.search, key)
+        logging.debug(f"RAW API Response for '{key}': {results}")
+
+        # tmdbv3api returns an iterator; keep only real media objects
+        items = [_media_to_dict(item) for item in results if hasattr(item, 'id')]
+        self.cache.set(kind, key, items)
+        return [_media_from_dict(data) for data in items]
+
+    def _strip_season_markers(self, title):
+        """
+        Drops season and pack markers from a cleaned show folder title, so "Show S01" and
+        "Show Season 2 Complete" both become "Show". Other numbers and words are part of the
+        title and are kept ("Babylon 5", "The Four Seasons", "The Pack").
+        """
+        words = title.split()
+        lowers = [word.lower().strip('-,') for word in words]
+        kept = []
+        after_marker = False # Pack words are only dropped right after a season marker
+        i = 0
+        while i < len(words):
+            lower = lowers[i]
+            if SEASON_MARKER_PATTERN.fullmatch(lower):
+                after_marker = True
+            elif lower in SEASON_WORDS and i + 1 < len(words) and SEASON_NUMBER_PATTERN.fullmatch(lowers[i + 1]):
+                after_marker = True
+                i += 1 # Its season number
+            elif not (after_marker and lower in SEASON_FOLDER_WORDS):
+                after_marker = False
+                kept.append(i)
+            i += 1
+        # "Show Complete Series": a trailing run of pack words that says "complete"
+        end = len(kept)
+        while end and lowers[kept[end - 1]] in SEASON_FOLDER_WORDS:
+            end -= 1
+        if any(lowers[index] == 'complete' for index in kept[end:]) \
+                and any(lowers[index] not in STOP_WORDS for index in kept[:end]): # Not "The Complete Series"
+            del kept[end:]
+        return " ".join(words[index] for index in kept) or title
+
+    def _normalize_show_title(self, title):
+        """Reduces a show title (already stripped of season markers) to a stable lookup key."""
+        return " ".join(re.sub(r'[^a-z0-9]+', ' ', title.lower()).split()) or title.lower().strip()
+
+    def _get_show_details(self, show_id, refresh=False):
+        """
+        Returns the detailed show object for a TMDb id, fetched at most once per run
+        and served from the persistent cache on later runs. With refresh=True the
+        cached copy is bypassed and the show refetched, at most once per run.
+        """
+        if refresh:
+            return self.single_flight.do(('tv_details', show_id, 'refresh'), self._load_show_details, show_id, True)
+        if show_id in self.show_cache:
+            return self.show_cache[show_id]
+        return self.single_flight.do(('tv_details', show_id), self._load_show_details, show_id)
+
+    def _load_show_details(self, show_id, refresh=False):
+        if refresh and ('tv_details', show_id) in self._refreshed:
+            return self.show_cache[show_id]
+        data = None if refresh else self.cache.get('tv_details', str(show_id))
+        if data is None:
+            # --- FIX: Use a new TV() object to get details and a Season() object for season info ---
+            show_details = self._tmdb_request(TV().details, show_id)
+            logging.debug(f"Fetched full show details for '{show_details.name}'.")
+            data = _media_to_dict(show_details)
+            data['number_of_seasons'] = getattr(show_details, 'number_of_seasons', 0)
+            data['seasons'] = [{'season_number': season.season_number, 'episode_count': season.episode_count,
+                                'air_date': getattr(season, 'air_date', None)}
+                               for season in getattr(show_details, 'seasons', [])]
+            self.cache.set('tv_details', str(show_id), data)
+
+        show_details = _media_from_dict(data)
+        self.show_cache[show_id] = show_details
+        if refresh:
+            self._refreshed.add(('tv_details', show_id))
+        return show_details
+
+    def _get_known_show(self, title_key):
+        """Returns the show details previously resolved for a normalized title, if any."""
+        show_id = self.show_title_ids.get(title_key)
+        if show_id is None:
+            show_id = self.cache.get('show_title', title_key)
+            if show_id is None:
+                return None
+            self.show_title_ids[title_key] = show_id
+        return self._get_show_details(show_id)
+
+    def _get_season_info(self, show_id, season_num, refresh=False):
+        """
+        Returns the episode padding and episode-number -> title map for a season.
+        Each season is fetched at most once per run, and not at all while it is
+        still fresh in the persistent cache. With refresh=True the cached copy is
+        bypassed and the season refetched, at most once per run.
+        """
+        key = (show_id, season_num)
+        if refresh:
+            return self.single_flight.do(('season', show_id, season_num, 'refresh'),
+                                         self._load_season_info, show_id, season_num, True)
+        if key in self.season_cache:
+            return self.season_cache[key]
+        return self.single_flight.do(('season', show_id, season_num), self._load_season_info, show_id, season_num)
+
+    def _load_season_info(self, show_id, season_num, refresh=False):
+        key = (show_id, season_num)
+        if refresh and ('season',) + key in self._refreshed:
+            return self.season_cache[key]
+        info = None if refresh else self.cache.get('season', f"{show_id}:{season_num}")
+        if info is None:
+            # CORRECTED: Use the Season object to get season details
+            season_details = self._tmdb_request(Season().details, show_id, season_num)
+            episodes = season_details.episodes
+            # Pad episode number based on total episodes in season
+            info = {
+                'ep_padding': 3 if len(episodes) > 99 else 2,
+                'titles': {str(ep.episode_number): ep.name for ep in episodes},
+                'air_dates': {str(ep.episode_number): getattr(ep, 'air_date', None) for ep in episodes},
+            }
+            self.cache.set('season', f"{show_id}:{season_num}", info)
+            logging.debug(f"Fetched season {season_num} of show {show_id}: {len(episodes)} episodes.")
+
+        # JSON object keys are always strings; convert them back to episode numbers
+        info = {'ep_padding': info['ep_padding'],
+                'titles': {int(num): title for num, title in info['titles'].items()},
+                'air_dates': {int(num): date for num, date in info['air_dates'].items()}}
+        self.season_cache[key] = info
+        if refresh:
+            self._refreshed.add(('season',) + key)
+        return info
+
+    def _resolve_episode(self, show_details, parsed):
+        """
+        Maps a parsed episode name to (season number, [episode numbers]) for a show.
+        SxxExx names map directly; absolute numbers ("Show - 137") and air dates
+        ("Show.2024.03.14") are looked up in the show's cached episode tables, which
+        are refetched once when they do not list the episode yet (a show still airing).
+        Returns (None, []) when the episode cannot be placed.
+        """
+        if parsed.season is not None:
+            return parsed.season, parsed.episodes
+        if parsed.absolute_episode is None and parsed.air_date is None:
+            return None, []
+        match = None
+        for refresh in (False, True):
+            if refresh:
+                show_details = self._get_show_details(show_details.id, refresh=True)
+            if parsed.absolute_episode is not None:
+                match = self._find_absolute_episode(show_details, parsed.absolute_episode, refresh)
+            else:
+                match = self._find_episode_by_air_date(show_details, parsed.air_date, refresh)
+            if match:
+                break
+        return (match[0], [match[1]]) if match else (None, [])
+
+    def _find_absolute_episode(self, show_details, absolute_num, refresh=False):
+        """
+        Counts through the regular seasons' episode counts (specials excluded) to find
+        the season holding an absolute episode number. Only that one season is fetched
+        (refetched with refresh=True).
+        """
+        remaining = absolute_num
+        for season in sorted(show_details.seasons, key=lambda season: season['season_number']):
+            if season['season_number'] < 1:
+                continue
+            if remaining <= season['episode_count']:
+                season_num = season['season_number']
+                # Some shows keep counting across seasons on TMDb, so take the nth listed episode
+                numbers = sorted(self._get_season_info(show_details.id, season_num, refresh)['titles'])
+                return season_num, numbers[remaining - 1] if remaining <= len(numbers) else remaining
+            remaining -= season['episode_count']
+        return None
+
+    def _find_episode_by_air_date(self, show_details, air_date, refresh=False):
+        """
+        Finds the episode that aired on a date. Seasons are fetched newest-first among
+        those that had started by then, so usually only one season is needed, and every
+        fetched season's air dates are kept for the show's later files. With refresh=True
+        the newest of those seasons is refetched, as only it can have gained episodes.
+        """
+        episodes = self.air_date_episodes.setdefault(show_details.id, {})
+        seasons = [season for season in show_details.seasons if season['season_number'] >= 1]
+        # Seasons cached without a start date are tried as if they had started
+        started = [season for season in seasons if (season.get('air_date') or '') <= air_date]
+        for index, season in enumerate(sorted(started, key=lambda season: season['season_number'], reverse=True)):
+            if air_date in episodes:
+                break
+            season_num = season['season_number']
+            season_info = self._get_season_info(show_details.id, season_num, refresh and index == 0)
+            for episode_num, date in season_info['air_dates'].items():
+                if date:
+                    episodes.setdefault(date, (season_num, episode_num))
+        return episodes.get(air_date)
 
     def _sanitize_filename(self, name):
         """Removes characters that are illegal in filenames."""
@@ -140,740 +1654,875 @@ class SorterWorker(QObject):
         """The core logic for finding, identifying, and moving media files."""
         self.log_message.emit("--- Starting Sort ---")
         
-        media_files = []
-        for dp, dn, fn in os.walk(self.source_dir):
-            for f in fn:
-                if any(f.lower().endswith(ext) for ext in VIDEO_EXTENSIONS):
-                    media_files.append(os.path.join(dp, f))
-        
-        total_files = len(media_files)
-        if total_files == 0:
+        self._load_review_queue()
+        if not self.dry_run_plan: # A dry run never touches files, not even to recover
+            self._resume_journal()
+
+        # In watch mode the watcher starts before the scan, so files that arrive while the
+        # initial sort runs (possibly for hours) are not missed
+        watcher = self._start_watcher() if self.watch else None
+        settling = {} # Watch mode: path -> (last seen size, time the size last changed)
+
+        # Files stream in from the scanner while it is still walking the tree. The
+        # destination is excluded in case it lives inside the source folder.
+        scanner = MediaScanner(self.source_dir, exclude_dirs=[self.dest_dir], on_progress=self._on_files_discovered,
+                               index=self.scan_index)
+        self._files_discovered = 0
+        self._files_processed = 0
+        self._lookups_done = 0
+        media_files = iter(scanner)
+        if watcher:
+            media_files = self._skip_unsettled(media_files, settling)
+        try:
+            self._process_files(media_files)
+        except BaseException:
+            if watcher:
+                watcher.close()
+            raise
+        finally:
+            scanner.close()
+
+        if scanner.unchanged_files or scanner.unchanged_dirs:
+            self.log_message.emit(f"\nSkipped {scanner.unchanged_files} unchanged file(s) already handled in earlier runs "
+                                  f"({scanner.unchanged_dirs} unchanged folder(s) not re-listed).")
+        elif self._files_processed == 0 and self.is_running:
             self.log_message.emit("No video files found in the source directory.")
-            return
-
-        self.total_progress_update.emit(total_files, 0)
-
-        for i, full_path in enumerate(media_files):
-            if not self.is_running:
-                self.log_message.emit("--- Stop signal received. Halting process. ---")
-                break
-
-            self.total_progress_update.emit(total_files, i + 1)
-            self.file_progress_update.emit(100, 0)
-            
-            filename = os.path.basename(full_path)
-            self.log_message.emit(f"\nProcessing: {filename}")
-            logging.info(f"Processing file: {full_path}")
 
-            is_tv_show_file = re.search(r'[sS](\d{1,2})[eE](\d{1,2})', filename)
-            
-            if self.sort_mode == "movies" and is_tv_show_file:
-                self.log_message.emit("  Sorting mode is 'Movies Only'. Skipping TV episode.")
-                logging.info(f"Skipping TV episode '{filename}' due to 'Movies Only' mode.")
-                continue
-            if self.sort_mode == "tv" and not is_tv_show_file:
-                self.log_message.emit("  Sorting mode is 'TV Shows Only'. Skipping potential movie.")
-                logging.info(f"Skipping movie '{filename}' due to 'TV Shows Only' mode.")
-                continue
+        if self.watch:
+            # Ambiguous files are reviewed in a later interactive run so watching is never blocked
+            self._save_review_queue()
+            if watcher and self.is_running:
+                self.watch_source_folder(watcher, settling)
+            elif watcher:
+                watcher.close()
+        else:
+            self._review_deferred()
 
-            selected_media = None
-            search_term = ""
-            media_type_for_search = ""
-            
-            # Determine search term and type
-            if is_tv_show_file:
-                media_type_for_search = 'tv'
-                true_show_folder_path = self._find_true_show_folder(full_path, self.source_dir)
-                if true_show_folder_path in self.folder_cache:
-                    selected_media = self.folder_cache[true_show_folder_path]
-                    self.log_message.emit(f"  Using cached series for this folder: '{selected_media.name}'")
-                    logging.debug(f"Retrieved complete series object from cache for path: {true_show_folder_path}")
-                else:
-                    show_folder_name = os.path.basename(true_show_folder_path)
-                    search_term = self._clean_filename_for_search(show_folder_name)
-                    self.log_message.emit(f"  TV episode detected. Searching for series: '{search_term}'")
-            else:
-                media_type_for_search = 'movie'
-                search_term = self._clean_filename_for_search(filename)
-                self.log_message.emit(f"  Movie file detected. Using filename for search: '{search_term}'")
+    def _process_files(self, media_files):
+        """
+        Identifies and sorts every path from the `media_files` iterator through the
+        parse -> lookup -> plan -> execute pipeline. The plan stage has a single thread,
+        so the folder caches, the review queue and each file's log lines stay consistent.
+        """
+        execute = PipelineStage("Execute", self._execute_file, workers=self.execute_concurrency)
+        plan = PipelineStage("Plan", self._plan_file, next_stage=execute)
+        lookup = PipelineStage("Lookup", self._lookup_file, workers=self.lookup_concurrency, next_stage=plan)
+        parse = PipelineStage("Parse", self._parse_file, next_stage=lookup)
+        try:
+            for full_path in media_files:
+                if not self.is_running:
+                    break
+                parse.put(full_path)
+        finally:
+            # Stages keep draining after a stop (without doing the work) so nothing blocks
+            parse.close()
+            for stage in (parse, lookup, plan, execute):
+                stage.join()
+
+        self._log_transfer_summary()
+        if not self.is_running:
+            self.log_message.emit("--- Stop signal received. Halting process. ---")
+
+    def _log_transfer_summary(self):
+        if self.transfer_stats.files:
+            summary = self.transfer_stats.summary()
+            self.log_message.emit(f"\n{summary}")
+            logging.info(summary)
+            self.transfer_stats.reset()
+
+    def apply_saved_plan(self):
+        """
+        Executes a plan saved by a dry run: no scanning and no TMDb traffic, just the
+        file operations, with the same concurrency limits, journal and undo manifest.
+        """
+        self.log_message.emit(f"--- Applying plan '{self.saved_plan}' ---")
+        self._resume_journal()
+        _, _, rows = read_plan(self.saved_plan)
+        self._files_discovered = len(rows)
+        self._files_processed = 0
 
-            # Perform search if not cached
-            if not selected_media:
+        execute = PipelineStage("Execute", self._execute_file, workers=self.execute_concurrency)
+        try:
+            for row in rows:
+                if not self.is_running:
+                    break
+                source, destination = row['source'], row['destination']
                 try:
-                    # --- NEW: Aggregated Search Logic ---
-                    self.fetching_progress_update.emit(1, 0)
-                    
-                    words = [word for word in search_term.lower().split(' ') if word not in STOP_WORDS]
-                    search_terms = [" ".join(words[:j]) for j in range(len(words), 0, -1)]
-                    
-                    self.log_message.emit(f"  Generated search terms: {search_terms}")
-                    logging.info(f"Generated search terms for '{search_term}': {search_terms}")
-                    
-                    aggregated_results = []
-                    seen_ids = set()
-
-                    for term in search_terms:
-                        if not self.is_running: break
-                        self.log_message.emit(f"  Searching for term: '{term}'")
-                        try:
-                            if media_type_for_search == 'tv':
-                                results = self.tv_search.search(term)
-                            else:
-                                results = self.movie_search.search(term)
-                            
-                            logging.debug(f"RAW API Response for '{term}': {results}")
-                            
-                            for item in results: # tmdbv3api returns an iterator
-                                if hasattr(item, 'id') and item.id not in seen_ids:
-                                    aggregated_results.append(item)
-                                    seen_ids.add(item.id)
-                        except exceptions.TMDbException as e:
-                            self.log_message.emit(f"  API request for '{term}' timed out or failed. Continuing...")
-                            logging.warning(f"API request for '{term}' failed: {e}")
-
-
-                    
-                    self.fetching_progress_update.emit(1, 1)
-                    logging.info(f"Aggregated search yielded {len(aggregated_results)} unique results.")
-
-                    if not aggregated_results:
-                        self.log_message.emit(f"  Could not find any matching media for '{search_term}'. Skipping.")
-                        logging.warning(f"No results for aggregated search: '{search_term}'")
-                        continue
-                    
-                    if len(aggregated_results) == 1:
-                        selected_media = aggregated_results[0]
-                    else:
-                        # Emit signal to ask user for choice
-                        self.user_choice = None # Reset choice
-                        self.selection_needed.emit(list(aggregated_results), media_type_for_search)
-                        
-                        # Wait for user to make a choice
-                        while self.user_choice is None and self.is_running:
-                            time.sleep(0.1)
-                        
-                        selected_media = self.user_choice
-                
-                except Exception as e:
-                    self.log_message.emit(f"  API search failed: {e}. Skipping.")
-                    logging.error(f"API search failed for term '{search_term}': {e}", exc_info=True)
+                    operation = FileOperation(source, destination, row['method'],
+                                              self.device_limiter.device_of(source),
+                                              self.device_limiter.device_of(os.path.dirname(destination)),
+                                              os.stat(source))
+                except OSError as e:
+                    self.log_message.emit(f"\nSkipping '{source}': {e}")
+                    logging.warning(f"Skipping planned operation for '{source}': {e}")
+                    self._file_done()
                     continue
-
-            if not self.is_running: break # Check again after waiting for user
-
-            if selected_media == "skip":
-                self.log_message.emit("  File skipped by user.")
-                logging.info(f"File '{filename}' skipped by user.")
+                self.log_message.emit(f"\n{TRANSFER_METHODS[operation.method]} '{os.path.basename(source)}' to: {destination}")
+                self._claim_destination(operation)
+                self.journal.plan(operation)
+                execute.put(operation)
+        finally:
+            execute.close()
+            execute.join()
+
+        self._log_transfer_summary()
+        if not self.is_running:
+            self.log_message.emit("--- Stop signal received. Halting process. ---")
+
+    def _write_dry_run_plan(self):
+        operations = sorted(self.planned_operations, key=lambda operation: operation.source)
+        write_plan(self.dry_run_plan, self.source_dir, self.dest_dir, operations)
+        self.log_message.emit(f"\nDry run: {len(operations)} planned operation(s) written to '{self.dry_run_plan}'. "
+                              f"No files were changed.")
+        logging.info(f"Dry run plan with {len(operations)} operations written to '{self.dry_run_plan}'.")
+
+    def _file_done(self):
+        """Counts a file that has left the pipeline."""
+        with self._progress_lock:
+            self._files_processed += 1
+            self._files_discovered = max(self._files_discovered, self._files_processed)
+            self.total_progress_update.emit(self._files_discovered, self._files_processed)
+
+    def _start_watcher(self):
+        """Starts the inotify watch of the source folder, or returns None if it cannot."""
+        try:
+            watcher = InotifyWatcher(self.source_dir, exclude_dirs=[self.dest_dir])
+        except OSError as e:
+            self.log_message.emit(f"Could not start watching the source folder: {e}")
+            logging.error(f"Could not start inotify watch on '{self.source_dir}': {e}")
+            return None
+        self._watcher = watcher
+        return watcher
+
+    def _skip_unsettled(self, media_files, settling):
+        """
+        Watch mode: passes on the scanned files that are not being written any more. Files
+        modified within WATCH_SETTLE_SECONDS may still be downloading, so they are left in
+        `settling` for the watch loop's size check. Files passed on are remembered, so an
+        event for the same unchanged file is not sorted twice.
+        """
+        for path in media_files:
+            try:
+                st = os.stat(path)
+            except OSError:
                 continue
-            if not selected_media:
-                self.log_message.emit("  Selection failed or was aborted. Skipping.")
-                logging.warning(f"No valid media selected for '{filename}'.")
+            if time.time() - st.st_mtime < WATCH_SETTLE_SECONDS:
+                settling.setdefault(path, (-1, time.monotonic()))
+            else:
+                self._initial_sort_files[path] = (st.st_size, st.st_mtime_ns)
+                yield path
+
+    def watch_source_folder(self, watcher, settling):
+        """
+        Watch mode: waits on inotify events for the source folder and sorts each new file
+        once it has finished downloading (its size stayed the same for WATCH_SETTLE_SECONDS).
+        `settling` holds files the initial sort left for the size check. Runs until stop()
+        is called, then closes the watcher.
+        """
+        self.log_message.emit(f"\n--- Watching '{self.source_dir}' for new files. Stop sorting to exit. ---")
+        try:
+            while self.is_running:
+                for path in watcher.read_events(WATCH_POLL_SECONDS if settling else None):
+                    settling.setdefault(path, (-1, time.monotonic()))
+                if watcher.overflowed:
+                    # Events were dropped; fall back to a scan (cheap with the scan index)
+                    watcher.overflowed = False
+                    logging.warning("inotify event queue overflowed; rescanning the source folder.")
+                    for path in MediaScanner(self.source_dir, exclude_dirs=[self.dest_dir], index=self.scan_index):
+                        settling.setdefault(path, (-1, time.monotonic()))
+
+                ready = self._settled_files(settling)
+                if ready and self.is_running:
+                    logging.info(f"Watch mode: {len(ready)} new file(s) ready for sorting.")
+                    self._process_files(iter(ready))
+                    self._save_review_queue()
+                    if self.review_queue:
+                        self.log_message.emit(f"  {len(self.review_queue)} ambiguous item(s) are waiting for review "
+                                              f"in the next interactive run.")
+        finally:
+            self._watcher = None
+            watcher.close()
+
+    def _settled_files(self, settling):
+        """Removes and returns the files whose size has been stable for WATCH_SETTLE_SECONDS."""
+        now = time.monotonic()
+        ready = []
+        for path, (last_size, changed_at) in list(settling.items()):
+            try:
+                st = os.stat(path)
+            except OSError: # Deleted or renamed again before it settled
+                del settling[path]
                 continue
+            if st.st_size != last_size:
+                settling[path] = (st.st_size, now)
+            elif now - changed_at >= WATCH_SETTLE_SECONDS:
+                del settling[path]
+                if self._initial_sort_files.pop(path, None) == (st.st_size, st.st_mtime_ns):
+                    continue # Already sorted by the initial scan, unchanged since
+                if not self._is_queued_for_review(path):
+                    ready.append(path)
+        return sorted(ready)
+
+    def _on_files_discovered(self, count):
+        """Scanner callback: reports the growing number of discovered files."""
+        with self._progress_lock:
+            self._files_discovered = max(self._files_discovered, count)
+            self.total_progress_update.emit(self._files_discovered, self._files_processed)
+            self.fetching_progress_update.emit(self._files_discovered, self._lookups_done)
+        if count % (SCAN_PROGRESS_EVERY * 10) == 0:
+            logging.info(f"Scanning source folder: {count} video files found so far.")
+
+    def _parse_file(self, full_path):
+        """Parse stage: works out the media type and search inputs from the path alone."""
+        if not self.is_running:
+            return None
+        lookup = FileLookup(full_path)
+        filename = lookup.filename
+        logging.info(f"Processing file: {full_path}")
+        if self._is_queued_for_review(full_path):
+            lookup.log("  Already waiting in the review queue from an earlier session.")
+            lookup.skipped = True
+            return lookup
+
+        is_tv_show_file = lookup.parsed.is_episode
+        lookup.is_tv_show_file = is_tv_show_file
+        
+        if self.sort_mode == "movies" and is_tv_show_file:
+            lookup.log("  Sorting mode is 'Movies Only'. Skipping TV episode.")
+            logging.info(f"Skipping TV episode '{filename}' due to 'Movies Only' mode.")
+            lookup.skipped = True
+            return lookup
+        if self.sort_mode == "tv" and not is_tv_show_file:
+            lookup.log("  Sorting mode is 'TV Shows Only'. Skipping potential movie.")
+            logging.info(f"Skipping movie '{filename}' due to 'TV Shows Only' mode.")
+            lookup.skipped = True
+            return lookup
+
+        # Determine search term and type
+        if is_tv_show_file:
+            lookup.media_type = 'tv'
+            lookup.show_folder = self._find_true_show_folder(full_path, self.source_dir)
+            if lookup.show_folder in self.folder_cache:
+                lookup.selected_media = self.folder_cache[lookup.show_folder]
+                lookup.log(f"  Using cached series for this folder: '{lookup.selected_media.name}'")
+                logging.debug(f"Retrieved complete series object from cache for path: {lookup.show_folder}")
+            elif os.path.samefile(lookup.show_folder, self.source_dir):
+                # Loose episodes in the source folder itself are named after the file, not the folder
+                lookup.year = lookup.parsed.year
+                lookup.show_title = self._strip_season_markers(lookup.parsed.title)
+                lookup.show_title_key = self._normalize_show_title(lookup.show_title)
+            else:
+                folder = parse_name(os.path.basename(lookup.show_folder), is_file=False)
+                lookup.year = folder.year
+                lookup.show_title = self._strip_season_markers(folder.title)
+                lookup.show_title_key = self._normalize_show_title(lookup.show_title)
+        else:
+            lookup.media_type = 'movie'
+            lookup.year = lookup.parsed.year
+            lookup.search_term = lookup.parsed.title
+            lookup.log(f"  Movie file detected. Using filename for search: '{lookup.search_term}'")
+        return lookup
 
-            self.file_progress_update.emit(100, 25)
+    def _lookup_file(self, lookup):
+        """
+        Lookup stage: resolves TMDb candidates for a parsed file. Runs on the lookup pool,
+        so UI log lines are buffered on the FileLookup and emitted by the plan stage.
+        """
+        if not lookup.skipped and self.is_running:
+            try:
+                self._resolve_lookup(lookup)
+            except Exception as e:
+                lookup.log(f"  API search failed: {e}. Skipping.")
+                logging.error(f"API search failed for term '{lookup.search_term}': {e}", exc_info=True)
+                lookup.skipped = True
+        with self._progress_lock:
+            self._lookups_done += 1
+            self.fetching_progress_update.emit(max(self._files_discovered, self._lookups_done), self._lookups_done)
+        return lookup
+
+    def _resolve_lookup(self, lookup):
+        """Fetches and scores the TMDb candidates for a parsed file."""
+        if lookup.media_type == 'tv' and not lookup.selected_media:
+            lookup.selected_media = self._get_known_show(lookup.show_title_key)
+            if lookup.selected_media:
+                lookup.log(f"  Using cached series for '{lookup.show_title_key}': '{lookup.selected_media.name}'")
+                logging.debug(f"Resolved folder '{lookup.show_folder}' to show {lookup.selected_media.id} via title cache.")
+            else:
+                lookup.search_term = lookup.show_title
+                lookup.log(f"  TV episode detected. Searching for series: '{lookup.search_term}'")
+
+        # Perform search if not cached
+        if not lookup.selected_media:
+            # --- Query planner ---
+            # Terms run from most to least specific. Every result is scored against the
+            # cleaned name and year, and shorter terms are only tried while no confident
+            # match has been found.
+            words = [word for word in lookup.search_term.lower().split() if word not in STOP_WORDS]
+            search_terms = [" ".join(words[:j]) for j in range(len(words), 0, -1)]
             
-            # Process the selected media object
-            media_type = "TV" if hasattr(selected_media, 'name') else "Movies"
+            lookup.log(f"  Generated search terms: {search_terms}")
+            logging.info(f"Generated search terms for '{lookup.search_term}': {search_terms}")
             
-            try:
-                if media_type == "TV":
-                    title = selected_media.name
-                    year = selected_media.first_air_date.split('-')[0] if hasattr(selected_media, 'first_air_date') and selected_media.first_air_date else "N/A"
-                else: # Movie
-                    title = selected_media.title
-                    year = selected_media.release_date.split('-')[0] if hasattr(selected_media, 'release_date') and selected_media.release_date else "N/A"
-
-                if year == "N/A":
-                    self.log_message.emit(f"  Could not find year for '{title}'. Skipping.")
-                    logging.warning(f"No year found for '{title}' (ID: {selected_media.id}).")
-                    continue
-                
-                self.log_message.emit(f"  TMDb Match: {title} ({year}) - [{media_type}]")
-                
-                _, extension = os.path.splitext(filename)
-                
-                if media_type == "Movies":
-                    new_base_name = f"{title} ({year})"
-                    new_filename = f"{self._sanitize_filename(new_base_name)}{extension}"
-                    destination_path = os.path.join(self.dest_dir, "Movies", str(year))
-                else: # TV Show Logic
-                    ep_match = re.search(r'[sS](\d+)[eE](\d+)', filename)
-                    if not ep_match:
-                        self.log_message.emit("  Could not find SxxExx pattern in TV file. Skipping.")
-                        logging.warning(f"Could not parse SxxExx from TV file '{filename}'.")
-                        continue
-                    
-                    season_num, episode_num = int(ep_match.group(1)), int(ep_match.group(2))
-                    self.log_message.emit(f"  Detected Season {season_num}, Episode {episode_num}")
-                    
-                    self.fetching_progress_update.emit(1,0)
-                    
-                    # --- FIX: Use a new TV() object to get details and a Season() object for season info ---
-                    tv_details_fetcher = TV()
-                    
-                    # Fetch full details to get episode info and cache it
-                    # Check if the selected_media is already a detailed object from cache
-                    if not hasattr(selected_media, 'seasons'):
-                        show_details = tv_details_fetcher.details(selected_media.id)
-                        logging.debug(f"Fetched full show details for '{show_details.name}'.")
-                        if is_tv_show_file:
-                             self.folder_cache[self._find_true_show_folder(full_path, self.source_dir)] = show_details
-                             logging.debug("Complete series object with seasons saved to cache.")
-                    else:
-                        show_details = selected_media # It's already the detailed object from the cache
-                        logging.debug(f"Using cached show details for '{show_details.name}'.")
-
-                    # CORRECTED: Use the Season object to get season details
-                    season_details = Season().details(show_details.id, season_num)
-                    self.fetching_progress_update.emit(1,1)
-                    
-                    episode_title = "Unknown Episode"
-                    for ep in season_details.episodes:
-                        if ep.episode_number == episode_num:
-                            episode_title = ep.name
-                            break
-                    logging.debug(f"Found episode title: '{episode_title}'")
-                    
-                    self.file_progress_update.emit(100, 75)
-                    
-                    # Pad episode number based on total episodes in season
-                    total_episodes = len(season_details.episodes)
-                    ep_padding = 3 if total_episodes > 99 else 2
+            for n, term in enumerate(search_terms, 1):
+                if not self.is_running: break
+                lookup.log(f"  Searching for term: '{term}'")
+                try:
+                    results = self._search(lookup.media_type, term)
                     
-                    new_filename = f"S{season_num:02d}E{episode_num:0{ep_padding}d} - {self._sanitize_filename(episode_title)}{extension}"
-                    destination_path = os.path.join(self.dest_dir, "TV Shows", self._sanitize_filename(title), f"Season {season_num:02d}")
-
-                os.makedirs(destination_path, exist_ok=True)
-                full_destination_path = os.path.join(destination_path, new_filename)
-                
-                operation = shutil.copy2 if self.keep_originals else shutil.move
-                log_action = "Copying" if self.keep_originals else "Renaming and moving"
-                self.log_message.emit(f"  {log_action} to: {full_destination_path}")
-                logging.info(f"{log_action} '{full_path}' to '{full_destination_path}'")
-                operation(full_path, full_destination_path)
+                    for item in results:
+                        if item.id not in lookup.scores:
+                            lookup.candidates.append(item)
+                            lookup.scores[item.id] = self._score_candidate(
+                                item, lookup.search_term, lookup.year, lookup.media_type)
+                except exceptions.TMDbException as e:
+                    lookup.log(f"  API request for '{term}' timed out or failed. Continuing...")
+                    logging.warning(f"API request for '{term}' failed: {e}")
+                    continue
 
-            except Exception as e:
-                self.log_message.emit(f"  ERROR processing match: {e}")
-                logging.error(f"Error processing match for '{filename}': {e}", exc_info=True)
-            
-            self.file_progress_update.emit(100, 100)
+                best_score = max(lookup.scores.values(), default=0.0)
+                if best_score >= SEARCH_CONFIDENT_SCORE:
+                    if n < len(search_terms):
+                        logging.info(f"Confident match (score {best_score:.2f}) for '{term}'; "
+                                     f"skipping {len(search_terms) - n} shorter search terms.")
+                    break
+
+            # Best matches first, so the selection pane leads with the likeliest result
+            lookup.candidates.sort(key=lambda item: lookup.scores[item.id], reverse=True)
+            logging.info(f"Aggregated search yielded {len(lookup.candidates)} unique results.")
+            if len(lookup.candidates) == 1:
+                lookup.selected_media = lookup.candidates[0]
+            else:
+                lookup.selected_media = self._auto_select(lookup)
+                if lookup.selected_media:
+                    best = lookup.selected_media
+                    lookup.log(f"  Auto-selected '{getattr(best, 'title', None) or best.name}' "
+                               f"(confidence {lookup.scores[best.id]:.2f}, next best {lookup.scores[lookup.candidates[1].id]:.2f})")
+
+        # Prefetch show and season details while we are still off the file-operation stage
+        if lookup.selected_media and lookup.media_type == 'tv':
+            show_details = self._get_show_details(lookup.selected_media.id)
+            season_num, _ = self._resolve_episode(show_details, lookup.parsed)
+            if season_num is not None:
+                self._get_season_info(show_details.id, season_num)
+
+    def _defer_for_review(self, lookup):
+        """
+        Adds an ambiguous file to the review queue. Episodes of the same show share one
+        review item, so a single decision covers every file of that show.
+        """
+        if lookup.media_type == 'tv':
+            key = f"tv:{lookup.show_title_key}"
+            if os.path.samefile(lookup.show_folder, self.source_dir):
+                label = lookup.show_title # Loose episode: the folder is just the source folder
+            else:
+                label = os.path.basename(lookup.show_folder)
+        else:
+            key = f"movie:{lookup.full_path}"
+            label = lookup.filename
+        item = self.review_queue.get(key)
+        if item is None:
+            item = self.review_queue[key] = {
+                'key': key,
+                'label': label,
+                'media_type': lookup.media_type,
+                'search_term': lookup.search_term,
+                'show_title_key': lookup.show_title_key,
+                'candidates': list(lookup.candidates),
+                'files': [],
+            }
+        item['files'].append(lookup.full_path)
+        self.queued_paths.add(lookup.full_path)
+        self.log_message.emit(f"  {len(lookup.candidates)} possible matches. Added to the review queue.")
+        logging.info(f"Deferred ambiguous file '{lookup.full_path}' for review ({key}).")
 
+    def _is_queued_for_review(self, full_path):
+        return full_path in self.queued_paths
 
-# =============================================================================
-# PyQt5 GUI Components
-# =============================================================================
+    def _load_review_queue(self):
+        """Loads review items left undecided by an earlier session for this source folder."""
+        try:
+            with open(self.review_queue_path, encoding='utf-8') as f:
+                saved_items = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read review queue '{self.review_queue_path}': {e}")
+            return
 
-class UILogger(QObject, logging.Handler):
-    """
-    A custom logging handler that sends log records to the UI thread via a signal.
-    This avoids direct UI manipulation from other threads, preventing crashes.
-    """
-    log_updated = pyqtSignal(str)
+        for item in saved_items:
+            item['files'] = [path for path in item['files'] if os.path.exists(path)]
+            if item['files']:
+                item['candidates'] = [_media_from_dict(data) for data in item['candidates']]
+                self.review_queue[item['key']] = item
+                self.queued_paths.update(item['files'])
+        if self.review_queue:
+            count = sum(len(item['files']) for item in self.review_queue.values())
+            self.log_message.emit(f"Loaded {count} file(s) awaiting review from an earlier session.")
+
+    def _save_review_queue(self):
+        """Persists undecided review items so they can be resolved in a later session."""
+        if not self.review_queue:
+            if os.path.exists(self.review_queue_path):
+                os.remove(self.review_queue_path)
+            return
+        saved_items = [dict(item, candidates=[_media_to_dict(c) for c in item['candidates']])
+                       for item in self.review_queue.values()]
+        os.makedirs(os.path.dirname(self.review_queue_path), exist_ok=True)
+        temp_path = self.review_queue_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(saved_items, f, indent=1)
+        os.replace(temp_path, self.review_queue_path)
+
+    def _review_deferred(self):
+        """
+        Presents every deferred ambiguous match to the user in one go, then finishes
+        the files that were decided. Undecided items stay queued on disk.
+        """
+        if not self.review_queue:
+            self._save_review_queue()
+            return
+        self._save_review_queue()
+
+        items = list(self.review_queue.values())
+        file_count = sum(len(item['files']) for item in items)
+        # Published before is_running is checked, so a stop() arriving in between always
+        # finds the decision and cancels it instead of leaving the wait below blocked
+        decision = self._pending_decision = UserDecision()
+        if not self.is_running or not self.interactive:
+            self._pending_decision = None
+            self.log_message.emit(f"\n{file_count} ambiguous file(s) saved for review in a later session.")
+            return
 
-    def __init__(self, *args, **kwargs):
-        # Correctly initialize both parent classes
-        QObject.__init__(self, *args, **kwargs)
-        logging.Handler.__init__(self)
+        self.log_message.emit(f"\n--- {len(items)} ambiguous match(es) covering {file_count} file(s) need review ---")
+        self.selection_needed.emit(items)
+        
+        # Block until the user decides, the sort is stopped, or the timeout expires
+        decided = decision.wait(self.selection_timeout)
+        self._pending_decision = None
+
+        if not decided: # Stopped or timed out: keep everything for the next session
+            if self.is_running:
+                self.log_message.emit(f"No review decisions within {self.selection_timeout}s. "
+                                      f"{file_count} file(s) saved for a later session.")
+            return
+        choices = decision.choice if isinstance(decision.choice, list) else ["skip"] * len(items)
 
-    def emit(self, record):
-        msg = self.format(record)
-        self.log_updated.emit(msg)
+        for item, choice in zip(items, choices):
+            if not self.is_running:
+                break
+            if choice is None:
+                continue # Left for a later session
+            del self.review_queue[item['key']]
+            self.queued_paths.difference_update(item['files'])
+            for full_path in item['files']:
+                if choice == "skip":
+                    self.log_message.emit(f"\nProcessing: {os.path.basename(full_path)}\n  File skipped by user.")
+                    logging.info(f"File '{full_path}' skipped by user.")
+                    self._record_outcome(full_path, 'skipped')
+                    continue
+                if not os.path.exists(full_path):
+                    logging.warning(f"Reviewed file '{full_path}' no longer exists.")
+                    continue
+                lookup = FileLookup(full_path)
+                lookup.media_type = item['media_type']
+                lookup.is_tv_show_file = item['media_type'] == 'tv'
+                lookup.search_term = item['search_term']
+                lookup.show_title_key = item['show_title_key']
+                if lookup.is_tv_show_file:
+                    lookup.show_folder = self._find_true_show_folder(full_path, self.source_dir)
+                lookup.selected_media = choice
+                self._process_lookup(lookup)
+
+        self._save_review_queue()
+
+    def _record_outcome(self, full_path, outcome):
+        """Remembers how a file was handled so unchanged files can be skipped next run."""
+        if self.scan_index:
+            self.scan_index.record_outcome(full_path, outcome)
+
+    def _process_lookup(self, lookup):
+        """Plans and performs the file operation for one resolved file, outside the pipeline."""
+        operation = self._plan_operation(lookup)
+        if operation and self.dry_run_plan:
+            self.planned_operations.append(operation)
+        elif operation:
+            self._execute_operation(operation)
+
+    def _plan_file(self, lookup):
+        """Plan stage: decides what happens to a resolved file."""
+        if not self.is_running:
+            return None
+        operation = self._plan_operation(lookup)
+        if operation is None:
+            self._file_done()
+        return operation
+
+    def _execute_file(self, operation):
+        """Execute stage: performs a planned copy or move (or only collects it in a dry run)."""
+        if not self.is_running:
+            self.journal.finish(operation, 'cancelled')
+            self._release_destination(operation)
+        elif self.dry_run_plan:
+            with self._progress_lock:
+                self.planned_operations.append(operation)
+        else:
+            self._execute_operation(operation)
+        self._file_done()
 
+    def _claim_destination(self, operation):
+        """
+        Orders operations planned to the same destination (e.g. a 720p and a 1080p copy of
+        one episode): each waits for the previous one, so they never write it concurrently.
+        Called from the single plan thread, in the order operations reach the execute stage.
+        """
+        with self._progress_lock:
+            earlier = self._destination_owners.get(operation.destination)
+            if earlier is not None:
+                operation.waits_for = earlier
+            self._destination_owners[operation.destination] = operation
+
+    def _release_destination(self, operation):
+        operation.finished.set()
+        with self._progress_lock:
+            if self._destination_owners.get(operation.destination) is operation:
+                del self._destination_owners[operation.destination]
+
+    def _plan_operation(self, lookup):
+        """
+        Resolves the final selection for a file and works out its destination.
+        Returns a FileOperation, or None when the file is skipped, unmatched or deferred.
+        """
+        filename, full_path = lookup.filename, lookup.full_path
+        self.log_message.emit(f"\nProcessing: {filename}")
+        for message in lookup.messages:
+            self.log_message.emit(message)
+        if lookup.skipped:
+            return None
+
+        selected_media = lookup.selected_media
+        is_tv_show_file = lookup.is_tv_show_file
+        if not selected_media and is_tv_show_file:
+            # An earlier file in this run may have resolved the show while this lookup was in flight
+            selected_media = self.folder_cache.get(lookup.show_folder) or self._get_known_show(lookup.show_title_key)
+            if selected_media:
+                self.log_message.emit(f"  Using series resolved earlier in this run: '{selected_media.name}'")
+
+        if not selected_media:
+            if not lookup.candidates:
+                self.log_message.emit(f"  Could not find any matching media for '{lookup.search_term}'. Skipping.")
+                logging.warning(f"No results for aggregated search: '{lookup.search_term}'")
+                self._record_outcome(full_path, 'no_match')
+                return
+
+            # Ambiguous: park the file with its candidates and keep the pipeline moving
+            self._defer_for_review(lookup)
+            self._record_outcome(full_path, 'deferred')
+            return
 
-class MainWindow(QMainWindow):
-    """The main application window."""
-    def __init__(self):
-        super().__init__()
-        self.worker = None
-        self.thread = None
-        self.selection_results = []
-        self.selection_radio_buttons = []
-        self.init_ui()
-
-    def init_ui(self):
-        self.setWindowTitle("Plex Media Sorter (PyQt5 Edition)")
-        self.setGeometry(100, 100, 1400, 800)
+        # Process the selected media object
+        media_type = "TV" if hasattr(selected_media, 'name') else "Movies"
         
-        # Apply a dark theme stylesheet
-        self.setStyleSheet("""
-            QMainWindow {
-                background-color: #1f1f1f;
-            }
-            QFrame {
-                background-color: #1f1f1f;
-            }
-            QWidget {
-                color: #e0e0e0;
-                font-family: Helvetica;
-            }
-            QLabel {
-                color: #e5a00d; /* Plex Gold */
-                font-size: 12px;
-                background-color: transparent;
-            }
-            #TitleLabel {
-                font-weight: bold;
-                font-size: 14px;
-            }
-            #WarningLabel {
-                color: #999;
-                font-size: 9px;
-            }
-            QLineEdit {
-                background-color: #333;
-                border: 1px solid #555;
-                border-radius: 4px;
-                padding: 4px;
-                font-size: 12px;
-            }
-            QPushButton {
-                background-color: #e5a00d;
-                color: black;
-                font-size: 12px;
-                font-weight: bold;
-                border: none;
-                padding: 8px 16px;
-                border-radius: 4px;
-            }
-            QPushButton:hover {
-                background-color: #f0b429;
-            }
-            QPushButton:disabled {
-                background-color: #555;
-                color: #999;
-            }
-            #StopButton, #SkipButton {
-                background-color: #4c4c4c;
-                color: white;
-            }
-            #StopButton:hover, #SkipButton:hover {
-                background-color: #666;
-            }
-            #ForceStopButton {
-                background-color: #c00;
-                color: white;
-            }
-            #ForceStopButton:hover {
-                background-color: #e00;
-            }
-            QTextEdit, QScrollArea {
-                background-color: black;
-                color: #e5a00d;
-                border: 1px solid #4c4c4c;
-                border-radius: 4px;
-            }
-            QTextEdit {
-                 font-family: "Courier New", monospace;
-            }
-            QScrollArea > QWidget > QWidget {
-                background-color: black;
-            }
-            QProgressBar {
-                border: 1px solid #4c4c4c;
-                border-radius: 4px;
-                text-align: center;
-                color: white;
-            }
-            QProgressBar::chunk {
-                background-color: #e5a00d;
-                border-radius: 4px;
-            }
-            QRadioButton, QCheckBox {
-                font-size: 11px;
-                background-color: transparent;
-            }
-            QRadioButton::indicator::unchecked, QCheckBox::indicator::unchecked {
-                border: 1px solid #999;
-                background-color: #333;
-                border-radius: 7px;
-                width: 12px;
-                height: 12px;
-            }
-            QRadioButton::indicator::checked, QCheckBox::indicator::checked {
-                border: 1px solid #e5a00d;
-                background-color: #e5a00d;
-                border-radius: 7px;
-                width: 12px;
-                height: 12px;
-            }
-        """)
-
-        # Main container widget and layout
-        main_container = QWidget()
-        self.setCentralWidget(main_container)
-        outer_layout = QVBoxLayout(main_container)
-        main_layout = QHBoxLayout()
-
-        # --- Left Info Pane ---
-        left_pane = QFrame()
-        left_pane.setFixedWidth(250)
-        left_layout = QVBoxLayout(left_pane)
-        
-        info_text = """
-<b>Plex Media Sorter</b>
-<p>Designed by<br>TheIrishPacifist</p>
-<p>Programmed and<br>
-designed to assist<br>
-users in sorting their<br>
-media library for Plex.<br>
-This application could<br>
-be used for other<br>
-services, but please<br>
-check naming<br>
-requirements.</p>
-<p>For Plex we use:</p>
-<p>Movie Name (Year)<br>
-&<br>
-S00E00 - Episode<br>
-Name (zeros will<br>
-match the max number<br>
-of episodes, ex: a<br>
-season with 100<br>
-episodes would be<br>
-S01E001)</p>
-        """
-        info_label = QLabel(info_text)
-        info_label.setWordWrap(True)
-        info_label.setAlignment(Qt.AlignTop)
-        
-        # Plex Logo - Add your path here
-        plex_logo_label = QLabel()
         try:
-            # Using a placeholder path, replace with your actual path
-            plex_pixmap = QPixmap("/home/jamescreamer/Pictures/plex_logo.png").scaled(150, 150, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            plex_logo_label.setPixmap(plex_pixmap)
-        except Exception:
-            plex_logo_label.setText("Plex Logo Not Found")
-
-        left_layout.addWidget(info_label)
-        left_layout.addStretch()
-        left_layout.addWidget(plex_logo_label, alignment=Qt.AlignCenter)
-        left_layout.addWidget(QLabel("<i>Not sponsored or endorsed by Plex.</i>"), alignment=Qt.AlignCenter)
-
-        # --- Center Controls Pane ---
-        center_pane = QFrame()
-        center_layout = QVBoxLayout(center_pane)
-
-        # Directory Selection
-        center_layout.addWidget(QLabel("<b>Unsorted Media Location:</b>"))
-        self.source_dir_edit = QLineEdit()
-        center_layout.addWidget(self.source_dir_edit)
-        center_layout.addWidget(self._create_browse_button(self.source_dir_edit))
-
-        center_layout.addWidget(QLabel("<b>Sorted Media Destination:</b>"))
-        self.dest_dir_edit = QLineEdit()
-        center_layout.addWidget(self.dest_dir_edit)
-        center_layout.addWidget(self._create_browse_button(self.dest_dir_edit))
-
-        # Media Type Options
-        center_layout.addWidget(QLabel("<b>Select Your Media Type:</b>"))
-        self.radio_both = QRadioButton("Movies and TV Shows")
-        self.radio_tv = QRadioButton("TV Shows Only")
-        self.radio_movies = QRadioButton("Movies Only")
-        self.radio_both.setChecked(True)
-        center_layout.addWidget(self.radio_both)
-        center_layout.addWidget(self.radio_tv)
-        center_layout.addWidget(self.radio_movies)
-        
-        # Other Options
-        self.keep_originals_check = QCheckBox("Keep Original Files?")
-        self.generate_log_check = QCheckBox("Generate Debug Log?")
-        self.generate_log_check.setChecked(True) # Default to on
-        self.generate_log_check.setEnabled(False) # Keep it always on for now
-        
-        options_layout = QHBoxLayout()
-        options_layout.addWidget(self.keep_originals_check)
-        options_layout.addWidget(self.generate_log_check)
-        center_layout.addLayout(options_layout)
+            if media_type == "TV":
+                title = selected_media.name
+                year = selected_media.first_air_date.split('-')[0] if hasattr(selected_media, 'first_air_date') and selected_media.first_air_date else "N/A"
+            else: # Movie
+                title = selected_media.title
+                year = selected_media.release_date.split('-')[0] if hasattr(selected_media, 'release_date') and selected_media.release_date else "N/A"
+
+            if year == "N/A":
+                self.log_message.emit(f"  Could not find year for '{title}'. Skipping.")
+                logging.warning(f"No year found for '{title}' (ID: {selected_media.id}).")
+                return
+            
+            self.log_message.emit(f"  TMDb Match: {title} ({year}) - [{media_type}]")
+            
+            _, extension = os.path.splitext(filename)
+            
+            if media_type == "Movies":
+                new_base_name = f"{title} ({year})"
+                new_filename = f"{self._sanitize_filename(new_base_name)}{extension}"
+                destination_path = os.path.join(self.dest_dir, "Movies", str(year))
+            else: # TV Show Logic
+                # Fetch full details to get episode info and cache it
+                # Check if the selected_media is already a detailed object from cache
+                if not hasattr(selected_media, 'seasons'):
+                    show_details = self._get_show_details(selected_media.id)
+                    if is_tv_show_file:
+                        if not os.path.samefile(lookup.show_folder, self.source_dir): # Loose files share this folder
+                            self.folder_cache[lookup.show_folder] = show_details
+                        if lookup.search_term:
+                            # Remember the choice for every folder that normalizes to this title
+                            self.show_title_ids[lookup.show_title_key] = show_details.id
+                            self.cache.set('show_title', lookup.show_title_key, show_details.id)
+                        logging.debug("Complete series object with seasons saved to cache.")
+                else:
+                    show_details = selected_media # It's already the detailed object from the cache
+                    logging.debug(f"Using cached show details for '{show_details.name}'.")
+
+                parsed = lookup.parsed
+                season_num, episodes = self._resolve_episode(show_details, parsed)
+                if season_num is None:
+                    if parsed.absolute_episode is not None or parsed.air_date is not None:
+                        numbering = f"absolute episode {parsed.absolute_episode}" if parsed.air_date is None \
+                            else f"air date {parsed.air_date}"
+                        self.log_message.emit(f"  Could not find {numbering} of '{title}' on TMDb. Skipping.")
+                        logging.warning(f"No episode of show {show_details.id} matches {numbering} for '{filename}'.")
+                    else:
+                        self.log_message.emit("  Could not find SxxExx pattern in TV file. Skipping.")
+                        logging.warning(f"Could not parse SxxExx from TV file '{filename}'.")
+                    return
+                
+                if parsed.absolute_episode is not None:
+                    self.log_message.emit(f"  Detected absolute episode {parsed.absolute_episode}: "
+                                          f"Season {season_num}, Episode {episodes[0]}")
+                elif parsed.air_date is not None:
+                    self.log_message.emit(f"  Detected air date {parsed.air_date}: Season {season_num}, Episode {episodes[0]}")
+                elif len(episodes) > 1:
+                    self.log_message.emit(f"  Detected Season {season_num}, Episodes {episodes[0]}-{episodes[-1]}")
+                else:
+                    self.log_message.emit(f"  Detected Season {season_num}, Episode {episodes[0]}")
 
+                season_info = self._get_season_info(show_details.id, season_num)
+                if any(episode_num not in season_info['titles'] for episode_num in episodes):
+                    # A new episode of a season still airing: the cached season predates it
+                    season_info = self._get_season_info(show_details.id, season_num, refresh=True)
+                
+                # A multi-episode file takes every title from the same cached season lookup
+                episode_titles = []
+                for episode_num in episodes:
+                    episode_title = season_info['titles'].get(episode_num, "Unknown Episode")
+                    if episode_title not in episode_titles:
+                        episode_titles.append(episode_title)
+                episode_title = " & ".join(episode_titles)
+                logging.debug(f"Found episode title: '{episode_title}'")
+                
+                ep_padding = season_info['ep_padding']
+                
+                # Plex names multi-episode files "S01E01-E02 - Title 1 & Title 2"
+                episode_tag = f"S{season_num:02d}E{episodes[0]:0{ep_padding}d}"
+                if len(episodes) > 1:
+                    episode_tag += f"-E{episodes[-1]:0{ep_padding}d}"
+                new_filename = f"{episode_tag} - {self._sanitize_filename(episode_title)}{extension}"
+                destination_path = os.path.join(self.dest_dir, "TV Shows", self._sanitize_filename(title), f"Season {season_num:02d}")
+
+            full_destination_path = os.path.join(destination_path, new_filename)
+            operation = self._make_operation(full_path, full_destination_path)
+            if self.dry_run_plan:
+                self.log_message.emit(f"  Planned: {TRANSFER_METHODS[operation.method].lower()} to: {full_destination_path}")
+            else:
+                self._claim_destination(operation)
+                self.journal.plan(operation)
+                self.log_message.emit(f"  {TRANSFER_METHODS[operation.method]} to: {full_destination_path}")
+            return operation
 
-        # Action Buttons
-        self.start_button = QPushButton("Start Sorting")
-        self.start_button.clicked.connect(self.start_sorting)
-        center_layout.addWidget(self.start_button)
-        
-        self.stop_button = QPushButton("Stop Sorting")
-        self.stop_button.setObjectName("StopButton")
-        self.stop_button.setEnabled(False)
-        self.stop_button.clicked.connect(self.stop_sorting)
-        center_layout.addWidget(self.stop_button)
-
-        self.force_stop_button = QPushButton("Force Stop Process and Generate Debug Log")
-        self.force_stop_button.setObjectName("ForceStopButton")
-        self.force_stop_button.clicked.connect(self.force_stop)
-        center_layout.addWidget(self.force_stop_button)
-        
-        # FIX: Add warning label for force stop button
-        warning_label = QLabel("Only click this if the program is frozen. Please send me the debug log.")
-        warning_label.setObjectName("WarningLabel")
-        warning_label.setWordWrap(True)
-        center_layout.addWidget(warning_label)
-
-
-        # Progress Bars
-        center_layout.addStretch()
-        center_layout.addWidget(QLabel("Fetching Progress:"))
-        self.fetching_progress = QProgressBar()
-        center_layout.addWidget(self.fetching_progress)
-        
-        center_layout.addWidget(QLabel("Current File Progress:"))
-        self.file_progress = QProgressBar()
-        center_layout.addWidget(self.file_progress)
+        except Exception as e:
+            self.log_message.emit(f"  ERROR processing match: {e}")
+            logging.error(f"Error processing match for '{filename}': {e}", exc_info=True)
+            self._record_outcome(full_path, 'error')
+            return None
 
-        center_layout.addWidget(QLabel("Overall Progress:"))
-        self.total_progress = QProgressBar()
-        center_layout.addWidget(self.total_progress)
-        center_layout.addStretch()
+    def _make_operation(self, source, destination):
+        """
+        Chooses how to place a file. Source and destination on the same device (st_dev)
+        get a metadata-only rename, or a hardlink when originals are kept and hardlinking is on.
+        """
+        source_device = self.device_limiter.device_of(source)
+        dest_device = self.device_limiter.device_of(os.path.dirname(destination))
+        same_device = source_device == dest_device
+        if self.keep_originals:
+            method = 'hardlink' if self.hardlink_originals and same_device else 'copy'
+        else:
+            method = 'rename' if same_device else 'move'
+        return FileOperation(source, destination, method, source_device, dest_device, os.stat(source))
 
-        # Your Logo - Add your path here
-        your_logo_label = QLabel()
+    def _execute_operation(self, operation):
+        """
+        Creates the destination folder and places the file there, holding a slot
+        on both the source and destination devices for the duration.
+        """
+        source, destination = operation.source, operation.destination
+        log_action = TRANSFER_METHODS[operation.method]
+        size = operation.size
+        if operation.waits_for is not None:
+            logging.debug(f"'{source}' waits for an earlier operation on '{destination}'.")
+            operation.waits_for.finished.wait()
         try:
-            # Using a placeholder path, replace with your actual path
-            your_pixmap = QPixmap("/home/jamescreamer/Pictures/171210048.png").scaled(200, 200, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            your_logo_label.setPixmap(your_pixmap)
-        except Exception:
-            your_logo_label.setText("Your Logo Not Found")
-        center_layout.addWidget(your_logo_label, alignment=Qt.AlignCenter)
-
-
-        # --- Right Log Pane ---
-        right_pane = QFrame()
-        right_layout = QVBoxLayout(right_pane)
-
-        right_layout.addWidget(QLabel("<b>Action Log:</b>", objectName="TitleLabel"))
-        self.log_area = QTextEdit()
-        self.log_area.setReadOnly(True)
-        right_layout.addWidget(self.log_area, 2) # Give log area more space
-        
-        right_layout.addWidget(QLabel("<b>Selection (if needed):</b>", objectName="TitleLabel"))
-        self.selection_scroll_area = QScrollArea()
-        self.selection_scroll_area.setWidgetResizable(True)
-        self.selection_container = QWidget()
-        self.selection_layout = QVBoxLayout(self.selection_container)
-        self.selection_layout.setAlignment(Qt.AlignTop)
-        self.selection_scroll_area.setWidget(self.selection_container)
-        right_layout.addWidget(self.selection_scroll_area, 1) # Give selection less space
-
-        selection_button_layout = QHBoxLayout()
-        self.select_button = QPushButton("Select")
-        self.select_button.setEnabled(False)
-        self.select_button.clicked.connect(self.on_select_clicked)
-        self.skip_button = QPushButton("Skip")
-        self.skip_button.setObjectName("SkipButton")
-        self.skip_button.setEnabled(False)
-        self.skip_button.clicked.connect(self.on_skip_clicked)
-        selection_button_layout.addWidget(self.select_button)
-        selection_button_layout.addWidget(self.skip_button)
-        right_layout.addLayout(selection_button_layout)
-
-        # Setup thread-safe logging
-        log_handler = UILogger()
-        log_handler.setFormatter(logging.Formatter('%(message)s'))
-        log_handler.log_updated.connect(self.append_log_message) # Connect signal to slot
-        logging.getLogger().addHandler(log_handler)
-        logging.getLogger().setLevel(logging.INFO) # UI only needs to see INFO level and above
+            self.journal.ensure_synced(operation) # The resume must know about it before anything changes
+            slots = self.device_limiter.acquire(operation.source_device, operation.dest_device)
+            try:
+                self.transfer_stats.start()
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                logging.info(f"{log_action} '{source}' to '{destination}'")
+                progress = CopyProgress(os.path.basename(destination), size)
+                with self._progress_lock:
+                    self._active_copies.add(progress)
+                try:
+                    method = self._transfer(operation, lambda copied: self._report_copy_progress(progress, copied))
+                finally:
+                    with self._progress_lock:
+                        self._active_copies.discard(progress)
+            finally:
+                self.device_limiter.release(slots)
+
+            if method not in ('rename', 'hardlink'): # These write no file data
+                self.transfer_stats.add(size, method)
+                logging.info(f"Copied {size / 2**20:.1f} MiB for '{os.path.basename(destination)}' via {method}; "
+                             f"aggregate {self.transfer_stats.rate() / 2**20:.1f} MiB/s")
+            self.journal.finish(operation, 'done', method)
+            self.undo.record(operation, method)
+            self._record_outcome(source, 'copied' if operation.keep_original else 'moved')
+        except Exception as e:
+            self.log_message.emit(f"  ERROR {log_action.lower()} '{os.path.basename(source)}': {e}")
+            logging.error(f"Error {log_action.lower()} '{source}' to '{destination}': {e}", exc_info=True)
+            self.journal.finish(operation, 'failed')
+            self._record_outcome(source, 'error')
+        finally:
+            self._release_destination(operation)
         
-        # Add panes to main layout
-        main_layout.addWidget(left_pane)
-        main_layout.addWidget(center_pane)
-        main_layout.addWidget(right_pane, 3) # Give right pane more weight
-
-        help_label = QLabel("Please reach out with any bugs or check for updates at https://github.com/IrshPcfst")
-        help_label.setAlignment(Qt.AlignCenter)
-
-        outer_layout.addLayout(main_layout)
-        outer_layout.addWidget(help_label)
-
-    def append_log_message(self, message):
-        """Thread-safe method to append text to the log area."""
-        self.log_area.append(message)
-        self.log_area.moveCursor(QTextCursor.End)
-
-    def _create_browse_button(self, target_line_edit):
-        """Helper to create a browse button."""
-        button = QPushButton("Browse")
-        button.clicked.connect(lambda: self.browse_directory(target_line_edit))
-        return button
-
-    def browse_directory(self, target_line_edit):
-        """Opens a dialog to select a directory."""
-        directory = QFileDialog.getExistingDirectory(self, "Select Directory")
-        if directory:
-            target_line_edit.setText(directory)
-
-    def start_sorting(self):
-        """Validates inputs and starts the sorting worker thread."""
-        source = self.source_dir_edit.text()
-        dest = self.dest_dir_edit.text()
-
-        if not source or not dest or not os.path.isdir(source) or not os.path.isdir(dest):
-            QMessageBox.critical(self, "Error", "Please select valid source and destination folders.")
+        self._emit_copy_progress(force=True)
+
+    def _report_copy_progress(self, progress, copied):
+        """copy_file callback: updates the progress bar and logs throughput and ETA of long copies."""
+        progress.done = copied
+        self._emit_copy_progress()
+        sample = progress.sample(PROGRESS_LOG_SECONDS)
+        if sample and copied < progress.size:
+            rate, eta = sample
+            self.log_message.emit(f"  {progress.name}: {copied / 2**30:.1f} of {progress.size / 2**30:.1f} GiB, "
+                                  f"{rate / 2**20:.0f} MiB/s, ETA {format_duration(eta)}")
+
+    def _emit_copy_progress(self, force=False):
+        """
+        Shows the combined progress of every running copy on the file progress bar,
+        at most every PROGRESS_INTERVAL_SECONDS unless forced.
+        """
+        with self._progress_lock:
+            now = time.monotonic()
+            if not force and now - self._progress_emitted_at < PROGRESS_INTERVAL_SECONDS:
+                return
+            self._progress_emitted_at = now
+            total = sum(progress.size for progress in self._active_copies)
+            done = sum(progress.done for progress in self._active_copies)
+            # Percentages keep the values within the signal's int range for huge files
+            self.file_progress_update.emit(100, 100 * done // total if total else 100)
+
+    def _transfer(self, operation, on_progress=None):
+        """
+        Places one file using its planned method, falling back to a full copy or move
+        when the filesystem refuses the fast path. Returns the method actually used
+        (for copies, the copy engine method that moved the data).
+        """
+        source, destination = operation.source, operation.destination
+        if os.path.exists(destination) and os.path.samefile(source, destination):
+            # Already in place, e.g. hardlinked by an earlier run. Renaming a file onto a
+            # hardlink of itself is a silent no-op, so handle it here.
+            if not operation.keep_original:
+                os.remove(source)
+                return 'rename'
+            return 'hardlink'
+        if operation.method == 'rename':
+            try:
+                os.replace(source, destination)
+                return 'rename'
+            except OSError as e:
+                if e.errno != errno.EXDEV: # e.g. two bind mounts of one device
+                    raise
+                logging.info(f"Rename of '{source}' crossed filesystems; moving instead.")
+        elif operation.method == 'hardlink':
+            temp_path = operation.temp_path
+            try:
+                os.link(source, temp_path)
+                os.replace(temp_path, destination) # Overwrites like a copy would
+                return 'hardlink'
+            except OSError as e:
+                if os.path.lexists(temp_path):
+                    os.remove(temp_path)
+                logging.info(f"Could not hardlink '{source}' ({e}); copying instead.")
+
+        # Data is copied under a temporary name, so an interrupted copy never looks complete
+        temp_path = operation.temp_path
+        try:
+            method = copy_file(source, temp_path, on_progress)
+            # A short copy must never replace the destination, let alone cost the source of a move
+            copied, expected = os.path.getsize(temp_path), os.path.getsize(source)
+            if copied != expected:
+                raise OSError(errno.EIO, f"Copied {copied} of {expected} bytes of '{source}'")
+            os.replace(temp_path, destination)
+        except BaseException:
+            if os.path.lexists(temp_path):
+                os.remove(temp_path)
+            raise
+        if not operation.keep_original:
+            os.remove(source) # Cross-filesystem move: the copy is complete
+        return method
+
+    def _resume_journal(self):
+        """
+        Finishes or cleans up the operations an interrupted run left unfinished. Files whose
+        operation did not complete are left in place and sorted again by this run.
+        """
+        unfinished = OperationJournal.read_unfinished(self.journal.path)
+        if not unfinished:
+            return
+        self.log_message.emit(f"Recovering {len(unfinished)} file operation(s) left unfinished by an interrupted run.")
+        for record in unfinished:
+            try:
+                self._recover_operation(record)
+            except OSError as e:
+                self.log_message.emit(f"  Could not recover '{os.path.basename(record['source'])}': {e}")
+                logging.error(f"Could not recover journaled operation {record}: {e}", exc_info=True)
+        os.remove(self.journal.path)
+
+    def _recover_operation(self, record):
+        """Works out how far one journaled operation got and completes or undoes it."""
+        source, destination = record['source'], record['destination']
+        keep_original = record['method'] in ('copy', 'hardlink')
+        temp_path = record['temp']
+        if os.path.lexists(temp_path):
+            os.remove(temp_path)
+            self.log_message.emit(f"  Removed half-copied '{temp_path}'.")
+            logging.info(f"Removed partial destination '{temp_path}' of an interrupted operation.")
+
+        # Copies and hardlinks only appear under the final name once complete, but a file
+        # that was already there (an earlier run, another source) must not count as done
+        source_exists, finished = os.path.exists(source), self._is_operation_output(record)
+        if finished and keep_original and source_exists:
+            self._record_outcome(source, 'copied')
+        elif finished and source_exists:
+            # Crashed between finishing the copy and removing the original
+            os.remove(source)
+            self._record_outcome(source, 'moved')
+        elif not source_exists and os.path.exists(destination):
+            self._record_outcome(source, 'moved')
+        elif not source_exists:
+            self.log_message.emit(f"  '{source}' and its destination are both missing.")
+            logging.warning(f"Journaled operation lost both '{source}' and '{destination}'.")
             return
-
-        # Determine sort mode
-        if self.radio_tv.isChecked():
-            sort_mode = "tv"
-        elif self.radio_movies.isChecked():
-            sort_mode = "movies"
-        else:
-            sort_mode = "both"
-            
-        keep_originals = self.keep_originals_check.isChecked()
-
-        # --- Setup and start the worker thread ---
-        self.thread = QThread()
-        self.worker = SorterWorker(source, dest, sort_mode, keep_originals)
-        self.worker.moveToThread(self.thread)
-
-        # Connect worker signals to UI slots
-        self.worker.log_message.connect(self.append_log_message)
-        self.worker.total_progress_update.connect(lambda m, v: self.update_progress(self.total_progress, m, v))
-        self.worker.file_progress_update.connect(lambda m, v: self.update_progress(self.file_progress, m, v))
-        self.worker.fetching_progress_update.connect(lambda m, v: self.update_progress(self.fetching_progress, m, v))
-        self.worker.selection_needed.connect(self.handle_selection_request)
-        self.worker.finished.connect(self.on_sorting_finished)
-        
-        self.thread.started.connect(self.worker.run)
-        
-        self.thread.start()
-
-        # Update UI state
-        self.set_ui_state(is_sorting=True)
-        self.log_area.clear()
-        logging.info(f"Starting sort. Source: '{source}', Dest: '{dest}', Mode: '{sort_mode}', Keep Originals: {keep_originals}")
-
-    def stop_sorting(self):
-        """Signals the worker thread to stop."""
-        if self.worker:
-            self.worker.stop()
-            self.stop_button.setText("Stopping...")
-            self.stop_button.setEnabled(False)
-            self.force_stop_button.setEnabled(False)
-
-    def force_stop(self):
-        """FIX: Forcefully terminate the worker thread to prevent UI lock-up."""
-        if self.thread and self.thread.isRunning():
-            logging.warning("--- FORCE STOP ACTIVATED ---")
-            self.append_log_message("--- FORCE STOP ACTIVATED ---")
-            self.thread.terminate() # Immediately kill the thread
-            self.thread.wait() # Wait for termination to complete
-            self.on_sorting_finished(stopped_by_user=True) # Reset the UI
-
-
-    def handle_selection_request(self, results, media_type):
-        """Populates the inline selection pane instead of a dialog."""
-        self.clear_selection_pane()
-        self.selection_results = results
-        
-        for item in self.selection_results:
-            is_tv = hasattr(item, 'id') and hasattr(item, 'name') and hasattr(item, 'first_air_date')
-            is_movie = hasattr(item, 'id') and hasattr(item, 'title') and hasattr(item, 'release_date')
-
-            if is_tv:
-                title = item.name
-                year = item.first_air_date.split('-')[0] if item.first_air_date else "N/A"
-                kind = "TV Series"
-            elif is_movie:
-                title = item.title
-                year = item.release_date.split('-')[0] if item.release_date else "N/A"
-                kind = "Movie"
-            else:
-                logging.warning(f"Skipping malformed item in selection dialog: {item}")
-                continue
-
-            text = f"{title} ({year}) - [{kind}]"
-            rb = QRadioButton(text)
-            self.selection_radio_buttons.append(rb)
-            self.selection_layout.addWidget(rb)
-        
-        if self.selection_radio_buttons:
-            self.selection_radio_buttons[0].setChecked(True)
-            self.select_button.setEnabled(True)
-            self.skip_button.setEnabled(True)
-
-    def on_select_clicked(self):
-        """Handles the 'Select' button click."""
-        choice = None
-        for i, rb in enumerate(self.selection_radio_buttons):
-            if rb.isChecked():
-                choice = self.selection_results[i]
-                break
-        if self.worker:
-            self.worker.set_user_choice(choice)
-        self.clear_selection_pane()
-
-    def on_skip_clicked(self):
-        """Handles the 'Skip' button click."""
-        if self.worker:
-            self.worker.set_user_choice("skip")
-        self.clear_selection_pane()
-    
-    def clear_selection_pane(self):
-        """Clears the radio buttons from the selection area."""
-        for rb in self.selection_radio_buttons:
-            self.selection_layout.removeWidget(rb)
-            rb.deleteLater()
-        self.selection_radio_buttons.clear()
-        self.selection_results.clear()
-        self.select_button.setEnabled(False)
-        self.skip_button.setEnabled(False)
-
-    def on_sorting_finished(self, stopped_by_user):
-        """Cleans up after the worker thread is done."""
-        if stopped_by_user:
-            logging.info("Sorting stopped by user.")
-            self.append_log_message("\n--- Sorting Stopped by User ---")
         else:
-            logging.info("Sorting completed successfully.")
-            self.append_log_message("\n--- Sorting Complete! ---")
-            QMessageBox.information(self, "Complete", "All files have been processed!")
-        
-        self.set_ui_state(is_sorting=False)
-        if self.thread and self.thread.isRunning():
-            self.thread.quit()
-            self.thread.wait()
-        self.thread = None
-        self.worker = None
-
-
-    def update_progress(self, progress_bar, max_val, value):
-        """Updates a progress bar's value."""
-        if progress_bar.maximum() != max_val:
-            progress_bar.setMaximum(max_val)
-        progress_bar.setValue(value)
-
-    def set_ui_state(self, is_sorting):
-        """Enables or disables UI elements based on sorting state."""
-        self.start_button.setEnabled(not is_sorting)
-        self.stop_button.setEnabled(is_sorting)
-        self.force_stop_button.setEnabled(is_sorting)
-        self.stop_button.setText("Stop Sorting")
-        self.source_dir_edit.setEnabled(not is_sorting)
-        self.dest_dir_edit.setEnabled(not is_sorting)
-        
-        if not is_sorting:
-            self.update_progress(self.total_progress, 1, 0)
-            self.update_progress(self.file_progress, 1, 0)
-            self.update_progress(self.fetching_progress, 1, 0)
-            self.clear_selection_pane()
+            logging.info(f"Operation for '{source}' had not started; it will be sorted again.")
+            return
+        logging.info(f"Completed interrupted operation '{source}' -> '{destination}'.")
 
-    def closeEvent(self, event):
-        """Ensure the worker thread is stopped when closing the window."""
-        if self.thread and self.thread.isRunning():
-            self.stop_sorting()
-            self.thread.quit()
-            self.thread.wait()
-        event.accept()
+    def _is_operation_output(self, record):
+        """Whether a journaled operation's destination is the file that operation placed there."""
+        try:
+            stat = os.stat(record['destination'])
+        except FileNotFoundError:
+            return False
+        if [stat.st_dev, stat.st_ino] == record['inode']: # Renamed or hardlinked
+            return True
+        return stat.st_size == record['size'] and stat.st_mtime_ns == record['mtime_ns'] # Copied
 
 
 # =============================================================================
 # Application Entry Point
 # =============================================================================
-def setup_logging():
+def setup_logging(log_file="media_sorter.log"):
     """Sets up the file-based logging."""
     # Configure file logging
     log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(threadName)s - %(message)s')
-    file_handler = logging.FileHandler("media_sorter.log")
+    file_handler = logging.FileHandler(log_file)
     file_handler.setFormatter(log_formatter)
     file_handler.setLevel(logging.DEBUG) # Log everything to the file
 
@@ -883,14 +2532,131 @@ def setup_logging():
     root_logger.addHandler(file_handler)
 
 
-if __name__ == "__main__":
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Sort movies and TV shows into a Plex library using TMDb. "
+                    "Starts the GUI unless --source and --dest are given.")
+    parser.add_argument('--source', help="unsorted media folder (runs headless)")
+    parser.add_argument('--dest', help="sorted library folder (runs headless)")
+    parser.add_argument('--mode', choices=('both', 'tv', 'movies'), default='both',
+                        help="which media types to sort (default: both)")
+    parser.add_argument('--keep-originals', action='store_true', help="copy files instead of moving them")
+    parser.add_argument('--no-auto-select', action='store_true',
+                        help="queue every multi-result search for review instead of auto-selecting clear winners")
+    parser.add_argument('--all-files', action='store_true',
+                        help="process every file, not only new or changed ones")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep running and sort new files as they finish downloading")
+    parser.add_argument('--lookup-concurrency', type=int, default=LOOKUP_CONCURRENCY,
+                        help=f"number of concurrent TMDb lookups (default: {LOOKUP_CONCURRENCY})")
+    parser.add_argument('--copy-workers', type=int, default=EXECUTE_CONCURRENCY,
+                        help=f"number of concurrent copies/moves (default: {EXECUTE_CONCURRENCY})")
+    parser.add_argument('--per-device', type=int, default=DEVICE_CONCURRENCY,
+                        help=f"concurrent copies/moves allowed per disk (default: {DEVICE_CONCURRENCY})")
+    parser.add_argument('--hardlink', action='store_true',
+                        help="with --keep-originals, hardlink files that stay on the same filesystem instead of copying")
+    parser.add_argument('--dry-run', metavar='PLAN',
+                        help="scan and look up files, but only write the planned operations to PLAN "
+                             "(CSV for a .csv name, JSON otherwise)")
+    parser.add_argument('--apply-plan', metavar='PLAN',
+                        help="execute a plan saved by --dry-run, without scanning or TMDb lookups, and exit")
+    parser.add_argument('--rollback', metavar='MANIFEST',
+                        help="undo a sort run from its undo manifest ('last' for the most recent run) and exit")
+    parser.add_argument('--log-file', default="media_sorter.log", help="debug log location (default: %(default)s)")
+    return parser.parse_args(argv)
+
+
+def run_headless(args):
+    """
+    Runs a sort without any UI, printing the Action Log to stdout. Ambiguous matches are
+    saved to the review queue for a later GUI session. SIGINT/SIGTERM stop gracefully.
+    Returns the process exit code.
+    """
+    if args.apply_plan:
+        try:
+            args.source, args.dest, _ = read_plan(args.apply_plan)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error: could not read plan '{args.apply_plan}': {e}", file=sys.stderr)
+            return 2
+    else:
+        for path in (args.source, args.dest):
+            if not path or not os.path.isdir(path):
+                print(f"Error: '{path}' is not a directory. Both --source and --dest are required.", file=sys.stderr)
+                return 2
+        args.source, args.dest = os.path.abspath(args.source), os.path.abspath(args.dest)
+
+    worker = SorterWorker(args.source, args.dest, args.mode, args.keep_originals,
+                          lookup_concurrency=args.lookup_concurrency,
+                          auto_select_threshold=None if args.no_auto_select else AUTO_SELECT_THRESHOLD,
+                          use_scan_index=not args.all_files, watch=args.watch and not args.dry_run,
+                          execute_concurrency=args.copy_workers, device_concurrency=args.per_device,
+                          hardlink_originals=args.hardlink, dry_run_plan=args.dry_run, saved_plan=args.apply_plan)
+    worker.interactive = False
+    worker.log_message.connect(lambda message: print(message, flush=True))
+    stopped = []
+    worker.finished.connect(stopped.append)
+
+    def handle_stop_signal(signum, frame):
+        print(f"\n--- Received {signal.Signals(signum).name}. Finishing the current file and stopping. ---", flush=True)
+        worker.stop()
+
+    signal.signal(signal.SIGINT, handle_stop_signal)
+    signal.signal(signal.SIGTERM, handle_stop_signal)
+
+    logging.info(f"Starting headless sort. Source: '{args.source}', Dest: '{args.dest}', Mode: '{args.mode}', "
+                 f"Keep Originals: {args.keep_originals}, Watch: {args.watch}")
+    # The sort runs on its own thread so the main thread stays free to handle signals
+    thread = threading.Thread(target=worker.run, name="SorterWorker")
+    thread.start()
+    thread.join()
+    return 130 if stopped and stopped[0] else 0
+
+
+def run_rollback(args):
+    """Reverses a sort run recorded in an undo manifest. Returns the process exit code."""
+    path = latest_undo_manifest() if args.rollback == 'last' else args.rollback
+    if not path or not os.path.isfile(path):
+        print(f"Error: no undo manifest found for '{args.rollback}'.", file=sys.stderr)
+        return 2
+
+    print(f"--- Rolling back the run recorded in '{path}' ---", flush=True)
+    logging.info(f"Starting rollback of '{path}'.")
+    scan_index = ScanIndex()
+    try:
+        reverted, skipped = rollback_run(path, log=lambda message: print(message, flush=True), scan_index=scan_index)
+    finally:
+        scan_index.close()
+    if skipped:
+        # Kept (now listing only the skipped files) so the rollback can be retried
+        print(f"The undo manifest keeps the {skipped} skipped file(s); run --rollback again to retry them.")
+    else:
+        # Renamed so 'last' moves on to the run before it
+        os.replace(path, path + ".rolled-back")
+    print(f"--- Rollback finished: {reverted} file(s) restored, {skipped} skipped. ---")
+    logging.info(f"Rollback of '{path}' finished: {reverted} restored, {skipped} skipped.")
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+
     # Setup logging to file first
-    setup_logging()
+    setup_logging(args.log_file)
     
     # Add a message to the log file for each new run
     logging.info(f"\n{'='*50}\n--- Application Started at {datetime.now()} ---\n{'='*50}")
 
-    app = QApplication(sys.argv)
-    main_win = MainWindow()
-    main_win.show()
-    sys.exit(app.exec_())
+    if args.rollback:
+        return run_rollback(args)
+    if args.source or args.dest or args.apply_plan:
+        return run_headless(args)
+
+    # Qt is only loaded for the GUI. It is handed SorterWorker from this module object, so
+    # running this file as a script does not load a second copy of it under its own name.
+    from Plex_Media_Sorter_GUI import run_gui
+    return run_gui([sys.argv[0]] + argv, SorterWorker)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
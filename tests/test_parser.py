@@ -0,0 +1,74 @@
+"""Behaviour checks for Plex_Media_Sorter_Parser.parse_name."""
+import unittest
+
+from Plex_Media_Sorter_Parser import parse_name
+
+
+class ParseNameTests(unittest.TestCase):
+    def test_movie_with_release_tags(self):
+        parsed = parse_name("The.Matrix.1999.1080p.BluRay.x264-GRP.mkv")
+        self.assertEqual(parsed.title, "The Matrix")
+        self.assertEqual(parsed.year, 1999)
+        self.assertEqual((parsed.resolution, parsed.source, parsed.codec), ("1080p", "bluray", "x264"))
+        self.assertEqual(parsed.extension, ".mkv")
+        self.assertFalse(parsed.is_episode)
+
+    def test_year_group_is_kept(self):
+        parsed = parse_name("Movie Title (2001) [Director's Cut] 720p.mp4")
+        self.assertEqual((parsed.title, parsed.year, parsed.resolution), ("Movie Title", 2001, "720p"))
+
+    def test_sxxexx(self):
+        parsed = parse_name("Breaking.Bad.S01E02.720p.WEB-DL.mkv")
+        self.assertEqual(parsed.title, "Breaking Bad")
+        self.assertEqual((parsed.season, parsed.episode), (1, 2))
+        self.assertEqual(parsed.episodes, [2])
+        self.assertTrue(parsed.is_episode)
+
+    def test_sxxexx_attached_to_title_and_underscores(self):
+        self.assertEqual(parse_name("Show-S01E02.mkv").title, "Show")
+        parsed = parse_name("Some_Show_s1e5_hdtv.avi")
+        self.assertEqual((parsed.title, parsed.season, parsed.episode, parsed.source), ("Some Show", 1, 5, "hdtv"))
+
+    def test_episode_title_is_not_part_of_the_show_title(self):
+        parsed = parse_name("Breaking.Bad.S01E02.Cats.in.the.Bag.720p.mkv")
+        self.assertEqual((parsed.title, parsed.episode, parsed.resolution), ("Breaking Bad", 2, "720p"))
+        self.assertEqual(parse_name("The.Daily.Show.2024.03.14.Guest.Name.mkv").title, "The Daily Show")
+        self.assertEqual(parse_name("[Group] Some Anime - 12 - The Title [1080p].mkv").title, "Some Anime")
+
+    def test_multi_episode(self):
+        self.assertEqual(parse_name("Show.S01E01E02.mkv").episodes, [1, 2])
+        self.assertEqual(parse_name("Show.S01E01-E03.mkv").episodes, [1, 2, 3])
+        self.assertEqual(parse_name("Show.S01E01-GRP.mkv").episodes, [1])
+
+    def test_absolute_episode(self):
+        self.assertEqual(parse_name("Show - 137.mkv").absolute_episode, 137)
+        self.assertEqual(parse_name("Show - 01.mkv").absolute_episode, 1)
+        parsed = parse_name("[Group] Some Anime - 12 [1080p].mkv")
+        self.assertEqual((parsed.title, parsed.absolute_episode), ("Some Anime", 12))
+        self.assertTrue(parsed.is_episode)
+
+    def test_movie_title_ending_in_a_number_is_not_an_episode(self):
+        for name, title in (("Apollo - 13.mkv", "Apollo 13"), ("Movie - 2.mkv", "Movie 2")):
+            parsed = parse_name(name)
+            self.assertEqual(parsed.title, title)
+            self.assertFalse(parsed.is_episode)
+
+    def test_air_date(self):
+        parsed = parse_name("The.Daily.Show.2024.03.14.720p.mkv")
+        self.assertEqual((parsed.title, parsed.air_date, parsed.year), ("The Daily Show", "2024-03-14", None))
+        self.assertEqual(parse_name("Late Show 2024-03-14.mkv").air_date, "2024-03-14")
+        self.assertIsNone(parse_name("Show.2024.13.14.mkv").air_date) # No 13th month
+
+    def test_year_as_title(self):
+        parsed = parse_name("1917.2019.mkv")
+        self.assertEqual((parsed.title, parsed.year), ("1917", 2019))
+        parsed = parse_name("2012.mkv")
+        self.assertEqual((parsed.title, parsed.year), ("2012", None))
+
+    def test_folder_names_keep_dots(self):
+        parsed = parse_name("Mr. Robot (2015)", is_file=False)
+        self.assertEqual((parsed.title, parsed.year, parsed.extension), ("Mr Robot", 2015, ""))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+"""Behaviour checks for SorterWorker helpers in Plex_Media_Sorter_TMDB."""
+import unittest
+
+try:
+    from Plex_Media_Sorter_TMDB import SorterWorker
+except ImportError: # tmdbv3api is not installed
+    SorterWorker = None
+
+
+@unittest.skipIf(SorterWorker is None, "tmdbv3api is not installed")
+class StripSeasonMarkersTests(unittest.TestCase):
+    def setUp(self):
+        self.worker = SorterWorker.__new__(SorterWorker) # The helpers need no sorting state
+
+    def test_season_markers_are_dropped(self):
+        for folder in ("Show S01", "Show S01-S03 Pack", "Show Season 2 Complete", "Show Seasons 1-3",
+                       "Show S01 Complete", "Show Complete Series", "Show Series 4"):
+            self.assertEqual(self.worker._strip_season_markers(folder), "Show", folder)
+
+    def test_title_words_are_kept(self):
+        for folder in ("The Pack", "The Four Seasons", "A Series of Unfortunate Events", "Babylon 5",
+                       "Station 19", "The Complete Series"):
+            self.assertEqual(self.worker._strip_season_markers(folder), folder)
+        self.assertEqual(self.worker._strip_season_markers("Babylon 5 Season 2"), "Babylon 5")
+
+
+if __name__ == "__main__":
+    unittest.main()